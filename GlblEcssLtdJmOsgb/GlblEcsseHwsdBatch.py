@@ -0,0 +1,165 @@
+#-------------------------------------------------------------------------------
+# Name:        GlblEcsseHwsdBatch.py
+# Purpose:     command line counterpart of GlblEcsseHwsdGUI.py for generating studies without PyQt
+# Author:      Mike Martin
+# Created:     18/10/2026
+# Licence:     <your licence>
+# Description: usage: python GlblEcsseHwsdBatch.py setup_file config_file [--max_cells N] [--bbox]
+#              where setup_file is as used by the GUI e.g. glbl_ecss_setup_ltd_jm_osgb.json and config_file is a
+#              study configuration file e.g. global_ecosse_config_hwsd_<study>.json
+#              --n_workers N generates cells using N worker processes
+#              --wthr_link_mode copy|hardlink|symlink determines how weather files are placed in the sims tree
+#              --n_writers N writes cell files using N background threads
+#              --journal records the cells generated so that an interrupted run can be resumed
+#              --resume skips cells already written by an interrupted or smaller run of the same study
+#              --drvr_chunk_size N streams the driver file in chunks of N records
+#              --no_drvr_cache parses the driver file without using or writing its binary cache
+#              --run_ecosse runs the ECOSSE executable named in the run sites file over the cells once generated
+#              --n_ecosse_workers N runs ECOSSE using N concurrent processes
+#              --ecosse_timeout S kills an ECOSSE run of a cell which takes longer than S seconds, 0 for no limit
+#              --metrics writes progress reports, including rates and time remaining, to progress_metrics.jsonl
+#              --stage_timers reports the total, mean and 95th percentile time taken by each stage of generation
+#              --shared_mdl_swtchs hard links the Model_Switches file of each cell to a single file of the study
+#-------------------------------------------------------------------------------
+#
+__prog__ = 'GlblEcsseHwsdBatch.py'
+__version__ = '0.0.1'
+__author__ = 's03mm5'
+
+import sys
+from os.path import abspath, join
+from time import time
+from datetime import timedelta
+from argparse import ArgumentParser
+
+from headless_fns import BatchForm
+from initialise_funcs import initiation_batch
+from grid_osgb_high_level_fns import make_grid_cell_sims, make_bbox_sims
+from prepare_ecss_files_from_cell import WTHR_LINK_MODES
+from ecosse_scheduler import fetch_ecosse_exe, run_ecosse_cells, launch_ecosse
+from glbl_ecss_cmmn_funcs import write_study_definition_file
+
+ERROR_STR = '*** Error *** '
+
+def _parse_args(argv):
+    """
+    parse command line arguments
+    """
+    parser = ArgumentParser(prog=__prog__, description='Generate ECOSSE simulation files for a study without PyQt')
+    parser.add_argument('setup_file', help='setup file e.g. glbl_ecss_setup_ltd_jm_osgb.json')
+    parser.add_argument('config_file', help='study configuration file e.g. global_ecosse_config_hwsd_<study>.json')
+    parser.add_argument('--max_cells', type=int, help='maximum number of cells to generate, overrides n_coords')
+    parser.add_argument('--n_workers', type=int, help='number of worker processes, overrides setup file setting')
+    parser.add_argument('--bbox', nargs=4, type=float, metavar=('LON_LL', 'LAT_LL', 'LON_UR', 'LAT_UR'),
+                        help='restrict generation to this bounding box')
+    parser.add_argument('--wthr_link_mode', choices=WTHR_LINK_MODES,
+                        help='how weather files are placed in the sims tree, overrides setup file setting')
+    parser.add_argument('--n_writers', type=int,
+                        help='number of background threads writing cell files, overrides setup file setting')
+    parser.add_argument('--journal', action='store_true',
+                        help='journal the cells generated so that an interrupted run can be resumed')
+    parser.add_argument('--resume', action='store_true',
+                        help='skip cells journalled as written with unchanged content by a previous run')
+    parser.add_argument('--drvr_chunk_size', type=int,
+                        help='stream the driver file in chunks of this many records, overrides setup file setting')
+    parser.add_argument('--no_drvr_cache', action='store_true',
+                        help='parse the driver file without using or writing the driver cache')
+    parser.add_argument('--run_ecosse', action='store_true',
+                        help='run ECOSSE over the cells of the study once they have been generated')
+    parser.add_argument('--n_ecosse_workers', type=int,
+                        help='number of concurrent ECOSSE processes, overrides setup file setting')
+    parser.add_argument('--ecosse_timeout', type=float,
+                        help='seconds after which an ECOSSE run of a cell is killed, overrides setup file setting')
+    parser.add_argument('--metrics', action='store_true',
+                        help='write progress reports to progress_metrics.jsonl in the study directory')
+    parser.add_argument('--stage_timers', action='store_true',
+                        help='report time taken by each stage of cell generation')
+    parser.add_argument('--shared_mdl_swtchs', action='store_true',
+                        help='link the Model_Switches file of each cell to a single file shared by the study')
+
+    return parser.parse_args(argv)
+
+def _fetch_ovrrds(args):
+    """
+    settings given on the command line which take precedence over those of the setup file
+    """
+    ovrrds = {}
+    for key in ['n_workers', 'wthr_link_mode', 'n_writers', 'drvr_chunk_size', 'n_ecosse_workers', 'ecosse_timeout']:
+        val = getattr(args, key)
+        if val is not None:
+            ovrrds[key] = val
+
+    if args.journal:
+        ovrrds['journal_flag'] = True
+
+    if args.resume:
+        ovrrds['resume_flag'] = True
+
+    if args.no_drvr_cache:
+        ovrrds['drvr_cache_flag'] = False
+
+    if args.metrics:
+        ovrrds['metrics_flag'] = True
+
+    if args.stage_timers:
+        ovrrds['stage_timers_flag'] = True
+
+    if args.shared_mdl_swtchs:
+        ovrrds['shared_mdl_swtchs_flag'] = True
+
+    return ovrrds
+
+def main(argv=None):
+    """
+    returns 0 on success, 1 otherwise
+    """
+    args = _parse_args(argv)
+
+    form = BatchForm()
+    if not initiation_batch(form, abspath(args.setup_file), abspath(args.config_file), _fetch_ovrrds(args)):
+        return 1
+
+    if args.max_cells is not None:
+        form.w_ncoords.setText(str(args.max_cells))
+
+    study = form.w_study.text()
+    if study == '' or study.find(' ') >= 0:
+        print(ERROR_STR + 'study must not be blank or have spaces')
+        return 1
+    form.study = study
+
+    start_time = time()
+    if args.bbox is None:
+        ret_code = make_grid_cell_sims(form)
+    else:
+        for w_coord, coord in zip([form.w_ll_lon, form.w_ll_lat, form.w_ur_lon, form.w_ur_lat], args.bbox):
+            w_coord.setText(str(coord))
+        ret_code = make_bbox_sims(form)
+
+    if not ret_code:
+        return 1
+
+    write_study_definition_file(form, form.version)
+
+    if args.run_ecosse:
+        study_dir = join(form.sttngs['sims_dir'], study)
+        if form.sttngs['ecosse_launch_mode'] == 'runsites':
+            new_inst = launch_ecosse(form.sttngs, study_dir)
+            if new_inst is None or new_inst.wait() != 0:
+                return 1
+        else:
+            exepath = fetch_ecosse_exe(form.sttngs['runsites_cnfg_fn'])
+            if exepath is None:
+                return 1
+            failed = run_ecosse_cells(study_dir, exepath, int(form.sttngs['n_ecosse_workers']), form.w_prgrss,
+                                                                                float(form.sttngs['ecosse_timeout']))
+            if failed is None or len(failed) > 0:
+                return 1
+
+    scnds_elapsed = round(time() - start_time)
+    print('Time taken: ' + str(timedelta(seconds=scnds_elapsed)))
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -13,10 +13,9 @@ __author__ = 's03mm5'
 import sys
 from os.path import join, isfile, normpath
 from os import walk, getcwd, remove, chdir
-from time import time
 from datetime import timedelta
 from shutil import rmtree
-from subprocess import Popen, PIPE, STDOUT, DEVNULL
+from subprocess import Popen, DEVNULL
 
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QPixmap, QFont
@@ -33,6 +32,7 @@ from grid_osgb_high_level_fns import make_grid_cell_sims, move_spinup_files, adj
 from grid_osgb_classes_and_fns import make_hwsd_drvr_df, report_pi_csvs, report_spin_dir
 
 from initialise_funcs import (initiation, read_config_file, build_and_display_studies, write_runsites_cnfg_fn)
+from ecosse_scheduler import launch_ecosse
 from set_up_logging import OutLog
 
 WDGT_SIZE_80 = 80
@@ -58,6 +58,7 @@ class Form(QWidget):
         super(Form, self).__init__(parent)
 
         self.version = 'NetZeroPlus'
+        self.ecosse_inst = None     # process launched by runEcosseClicked
         initiation(self)
         font = QFont(self.font())
         font.setPointSize(font.pointSize() + 2)
@@ -244,6 +245,7 @@ class Form(QWidget):
         icol = 0
         w_mve_spin = QPushButton('Move spin to path', self)
         helpText = 'Move spinup files from each gridcell to the spinup path as spinup_easting_northing.dat files'
+        helpText += ' or, if the spinup path has a spinup archive, append them to the archive'
         w_mve_spin.setToolTip(helpText)
         w_mve_spin.setFixedWidth(WDGT_SIZE_110)
         w_mve_spin.setEnabled(False)
@@ -593,7 +595,15 @@ class Form(QWidget):
     def runEcosseClicked(self):
         """
         components of the command string have been checked at startup
+        cells of the study are run in a separate process, either the scheduler which runs the ECOSSE executable named
+        in the run sites file using concurrent processes, or the run sites script - see ecosse_launch_mode
+        the GUI is not held up while ECOSSE runs but a further run is refused until the launched process finishes
         """
+        if self.ecosse_inst is not None and self.ecosse_inst.poll() is None:
+            print(WARN_STR + 'ECOSSE is already running with process id: ' + str(self.ecosse_inst.pid))
+            QApplication.processEvents()
+            return
+
         if not write_runsites_cnfg_fn(self):
             return
 
@@ -604,37 +614,16 @@ class Form(QWidget):
         # ==================================================
         adjust_model_switches_files(self)
 
-        stdout_path = join(self.sttngs['sims_dir'], 'stdout.txt')
-        runsites_py = self.sttngs['runsites_py']
-        runsites_cnfg_fn = self.sttngs['runsites_cnfg_fn']
+        study_dir = normpath(join(self.sttngs['sims_dir'], self.w_study.text()))
 
-        # run the make simulations script
-        # ===============================
+        # run the cells of the study
+        # ==========================
         print('Working dir: ' + getcwd())
+        self.ecosse_inst = launch_ecosse(self.sttngs, study_dir)
         QApplication.processEvents()
-        command_line = [self.sttngs['python_exe'], runsites_py, runsites_cnfg_fn]
-        start_time = time()
-
-        success_flag = True
-        try:
-            # new_inst = Popen(command_line, shell=False, stdin=PIPE, stdout=open(stdout_path, 'w'), stderr=STDOUT)
-            new_inst = Popen(command_line, stderr=STDOUT)
-            if new_inst.pid is not None:
-                print('Launched: ' + runsites_py + ' with process id: ' + str(new_inst.pid))
-                QApplication.processEvents()
-
-        except OSError as err:
-            success_flag = False
-            mess = ERROR_STR + 'Run sites script ' + runsites_py
-            print(mess + ' could not be launched due to error ' + str(err))
-            QApplication.processEvents()            
 
         chdir(curr_dir)
 
-        scnds_elapsed = round(time() - start_time)
-        print('Time taken: ' + str(timedelta(seconds=scnds_elapsed)))
-        QApplication.processEvents()
-
         return
 
     def saveClicked(self):
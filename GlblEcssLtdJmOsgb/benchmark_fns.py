@@ -0,0 +1,362 @@
+#-------------------------------------------------------------------------------
+# Name:        benchmark_fns.py
+# Purpose:     build synthetic worlds and time the generation pipeline over them
+# Author:      Mike Martin
+# Created:     18/10/2026
+# Licence:     <your licence>
+# Description: usage: python benchmark_fns.py make bench_root 1k|10k|100k|ncells [--seed N]
+#                     python benchmark_fns.py run bench_root [--n_workers N] [--n_writers N] [--wthr_link_mode M]
+#                                                                                [--stage_timers] [--results fn]
+#              make writes a world of ncells land cells, an irregular island of 1 km cells in British National Grid
+#              so that a bounding box includes sea, comprising a driver CSV, LTA, plant input and weather files,
+#              a Model_Switches.dat file and the setup and study configuration files used by the batch script
+#              some cells are built up, have empty LTA files or no plant inputs as in real data
+#              run times make_bbox_sims, make_grid_cell_sims, adjust_model_switches_files and move_spinup_files
+#              over the world and reports cells and files per second for each; the driver is loaded beforehand
+#              and its load time also reported; results may be appended to a file as lines of JSON
+#-------------------------------------------------------------------------------
+#
+__prog__ = 'benchmark_fns.py'
+__version__ = '0.0.1'
+__author__ = 's03mm5'
+
+import sys
+from os import makedirs, scandir
+from os.path import join, isdir
+from shutil import rmtree
+from json import dump as json_dump, dumps as json_dumps
+from argparse import ArgumentParser
+from time import time
+
+from numpy import arange, argsort, sqrt, arctan2, sin, ceil
+from numpy.random import default_rng
+
+from headless_fns import BatchForm
+from cvrtcoord_arrays import OSGB36toWGS84_arrays
+from initialise_funcs import initiation_batch
+from prepare_ecss_files_from_cell import WTHR_LINK_MODES
+from grid_osgb_high_level_fns import make_grid_cell_sims, make_bbox_sims, adjust_model_switches_files, \
+                                                                                                move_spinup_files
+
+BENCH_SIZES = {'1k': 1000, '10k': 10000, '100k': 100000}
+BENCH_STUDY = 'bench'
+BENCH_REALIS = ('rcp26', '01')
+BENCH_CONFIG_FN = 'global_ecosse_config_hwsd_' + BENCH_STUDY + '.json'
+EAST_ORIGIN, NRTH_ORIGIN = 200500, 250500    # cell centre of south west corner of the world
+PI_STRT_YR, NPI_YRS = 2021, 10          # weather starts the year before the first plant input
+SPINUP_NLINES = 100                     # size of the spinup file placed in each cell before they are moved
+
+# proportions of land cells which are rejected
+# ============================================
+FRAC_BUILT_UP = 0.05
+FRAC_EMPTY_LTA = 0.03
+FRAC_NO_PI = 0.05
+
+DRVR_HDR = ['UID', 'BNG_X', 'BNG_Y', 'ECOSSE_lu_code', 'MU_GLOBAL', 'SHARE', 'S_soc_kg_ha', 'S_BULK_DENSITY',
+            'S_PH_H2O', 'S_CLAY', 'S_SAND', 'S_SILT', 'T_soc_kg_ha', 'T_BULK_DENSITY', 'T_PH_H2O', 'T_CLAY',
+            'T_SAND', 'T_SILT']
+
+WARN_STR = '*** Warning *** '
+ERROR_STR = '*** Error *** '
+
+def make_bench_world(bench_root, ncells, seed=1):
+    """
+    write a synthetic world of ncells land cells to bench_root
+    """
+    start_time = time()
+    rng = default_rng(seed)
+    rcp_realis = '_'.join(BENCH_REALIS)
+    lta_dir = join(bench_root, 'ECOSSE_LTA', rcp_realis)
+    rcp_dir = join(bench_root, 'ECOSSE_RCP', rcp_realis)
+    pi_dir = join(bench_root, 'plant_inputs')
+    for dirn in [lta_dir, rcp_dir, pi_dir] + [join(bench_root, dirn) for dirn in ['sims', 'log', 'config', 'ecss_fns',
+                                                                                                        'spinup']]:
+        makedirs(dirn, exist_ok=True)
+
+    eastngs, nrthngs = _make_island(ncells, rng)
+    print('Writing world of {} land cells over {} by {} km to {}'.format(ncells,
+                    (eastngs.max() - EAST_ORIGIN) // 1000 + 1, (nrthngs.max() - NRTH_ORIGIN) // 1000 + 1, bench_root))
+
+    lus = rng.choice([1, 2, 3, 4, 5, 6], size=ncells, p=[0.3, 0.3, 0.15, 0.1, 0.1, 0.05])
+    lus[rng.random(ncells) < FRAC_BUILT_UP] = 0
+    empty_lta = rng.random(ncells) < FRAC_EMPTY_LTA
+    no_pi = rng.random(ncells) < FRAC_NO_PI
+
+    # driver records in north then east order as in real driver files
+    # ================================================================
+    with open(join(bench_root, 'driver.csv'), 'w') as fdrvr:
+        fdrvr.write(','.join(DRVR_HDR) + '\n')
+        for eastng, nrthng, ecss_lu in zip(eastngs.tolist(), nrthngs.tolist(), lus.tolist()):
+            fdrvr.write('{}_{},{},{},{},{},100,'.format(eastng, nrthng, eastng, nrthng, ecss_lu,
+                                                                        int(rng.integers(1000, 30000))))
+            fdrvr.write(','.join(_make_soil_layer(rng, 1.0)) + ',' + ','.join(_make_soil_layer(rng, 0.5)) + '\n')
+
+    # LTA, weather and plant input files
+    # ==================================
+    yrs_wthr = range(PI_STRT_YR - 1, PI_STRT_YR + NPI_YRS)
+    for icell, (eastng, nrthng) in enumerate(zip(eastngs.tolist(), nrthngs.tolist())):
+        uid = '{}_{}'.format(eastng, nrthng)
+        tair_offset = 6.0 - 5.0 * (nrthng - NRTH_ORIGIN) / 1000000       # cooler to the north
+        precip = rng.uniform(40, 140, 12).round(1).tolist()
+        tair = (tair_offset + 5.0 * sin(arange(12) * 0.52 - 1.57) + rng.normal(0, 0.5, 12)).round(2).tolist()
+
+        with open(join(lta_dir, uid + '.csv'), 'w') as flta:
+            flta.write('month,mean_precip_mm,mean_Tair_degC\n')
+            for imnth in range(12):
+                flta.write('{},{},{}\n'.format(imnth + 1, precip[imnth], 'NA' if empty_lta[icell] else tair[imnth]))
+
+        wthr_dir = join(rcp_dir, uid)
+        makedirs(wthr_dir, exist_ok=True)
+        for yr in yrs_wthr:
+            with open(join(wthr_dir, '{}.dat'.format(yr)), 'w') as fwthr:
+                for imnth in range(12):
+                    fwthr.write('{:.1f}\t{:.1f}\t{:.2f}\n'.format(precip[imnth] * rng.uniform(0.5, 1.5),
+                                                        rng.uniform(10, 90), tair[imnth] + rng.normal(0, 1)))
+
+        if not no_pi[icell]:
+            pis = rng.uniform(500, 4500, NPI_YRS).round(3).tolist()
+            with open(join(pi_dir, uid + '.csv'), 'w') as fpi:
+                fpi.write('year,PI_kg_ha\n')
+                for iyr, pi_val in enumerate(pis):
+                    fpi.write('{},{}\n'.format(PI_STRT_YR + iyr, pi_val))
+
+    _write_mdl_swtchs(join(bench_root, 'ecss_fns', 'Model_Switches.dat'))
+    _write_bench_config(bench_root, pi_dir)
+
+    print('Wrote world in {:.1f} seconds'.format(time() - start_time))
+
+    return
+
+def _make_island(ncells, rng):
+    """
+    return eastings and northings of the ncells cells nearest the centre of a square where distance is scaled by an
+    irregular coastline; cells are ordered by northing then easting
+    """
+    side = int(ceil(sqrt(ncells / 0.6)))      # island occupies about 60% of the square
+    nodes = arange(side * side)
+    icols, irows = nodes % side, nodes // side
+    dx, dy = icols - side / 2, irows - side / 2
+    theta = arctan2(dy, dx)
+    phases = rng.uniform(0, 6.28, 3)
+    coast = 1 + 0.15 * sin(3 * theta + phases[0]) + 0.1 * sin(7 * theta + phases[1]) \
+                                                                            + 0.05 * sin(17 * theta + phases[2])
+    dist = sqrt(dx * dx + dy * dy) / coast + rng.uniform(0, 1.5, side * side)
+
+    land = sorted(argsort(dist, kind='stable')[:ncells].tolist())
+
+    return EAST_ORIGIN + 1000 * icols[land], NRTH_ORIGIN + 1000 * irows[land]
+
+def _make_soil_layer(rng, scale):
+    """
+    return soil organic carbon, bulk density, pH, clay, sand and silt of a layer as strings
+    """
+    clay, sand = rng.uniform(5, 45), rng.uniform(10, 60)
+    vals = [rng.uniform(20000, 150000) * scale, rng.uniform(0.9, 1.6), rng.uniform(4.0, 8.0), clay, sand,
+                                                                                                100 - clay - sand]
+    return ['{:.2f}'.format(val) for val in vals]
+
+def _write_mdl_swtchs(mdl_swtchs_fn):
+    """
+    line 16 is the spin up mode, see adjust_model_switches_files
+    """
+    with open(mdl_swtchs_fn, 'w') as fmdl:
+        for iline in range(1, 31):
+            if iline == 16:
+                fmdl.write('0         # Spin up: 0 = none, 1 = read spinup.dat, 2 = save spinup.dat\n')
+            else:
+                fmdl.write('{}         # Model switch {}\n'.format(iline % 3, iline))
+
+    return
+
+def _write_bench_config(bench_root, pi_dir):
+    """
+    setup and study configuration files as used by GlblEcsseHwsdBatch.py
+    """
+    setup = {'glbl_ecss_sttngs': {'config_dir': join(bench_root, 'config'),
+                                'ecss_fns_dir': join(bench_root, 'ecss_fns'), 'fname_png': '',
+                                'log_dir': join(bench_root, 'log'), 'python_exe': sys.executable,
+                                'runsites_py': '', 'sims_dir': join(bench_root, 'sims')},
+             'osgb_setup': {'uk_hwsd_driver_data': '', 'lta_dir': 'ECOSSE_LTA', 'rcp_dir': 'ECOSSE_RCP',
+                                                                                            'root_dir': bench_root}}
+    with open(join(bench_root, 'setup.json'), 'w') as fsetup:
+        json_dump(setup, fsetup, indent=2)
+
+    config = {'minGUI': {'bbox': [0, 0, 0, 0], 'wthrRsrce': 'CHESS', 'use_drvr_flag': True},
+              'cmnGUI': {'study': BENCH_STUDY, 'climScnr': BENCH_REALIS[0], 'realis': BENCH_REALIS[1],
+                         'eqilMode': '6', 'n_coords': '100000000', 'pi_data_dir': pi_dir,
+                         'spinup_dir': join(bench_root, 'spinup'), 'hwsd_drvr_fn': join(bench_root, 'driver.csv')}}
+    with open(join(bench_root, 'config', BENCH_CONFIG_FN), 'w') as fconfig:
+        json_dump(config, fconfig, indent=2)
+
+    return
+
+def run_benchmarks(bench_root, ovrrds=None, results_fn=None):
+    """
+    time each stage of the pipeline over the world in bench_root
+    ovrrds is a dictionary of settings which take precedence over those of the setup file
+    returns list of results, one dictionary per stage
+    """
+    results = []
+    study_dir = join(bench_root, 'sims', BENCH_STUDY)
+    spin_dir = join(bench_root, 'spinup')
+
+    start_time = time()
+    form = BatchForm()
+    if not initiation_batch(form, join(bench_root, 'setup.json'), join(bench_root, 'config', BENCH_CONFIG_FN),
+                                                                                                        ovrrds):
+        print(ERROR_STR + 'could not initialise from ' + bench_root)
+        return results
+    form.study = form.w_study.text()
+    ndrvr = len(form.hwsd_drvr_data)
+    results.append(_make_result('initiation', ndrvr, 1, time() - start_time))
+
+    # bounding box of the central quarter of the world by area
+    # ========================================================
+    bbox = _fetch_central_bbox(form.hwsd_drvr_data)
+    for w_coord, coord in zip([form.w_ll_lon, form.w_ll_lat, form.w_ur_lon, form.w_ur_lat], bbox):
+        w_coord.setText(str(coord))
+
+    for stage, func in [('make_bbox_sims', make_bbox_sims), ('make_grid_cell_sims', make_grid_cell_sims)]:
+        if isdir(study_dir):
+            rmtree(study_dir)
+        start_time = time()
+        func(form)
+        scnds = time() - start_time
+        ncells = len(_list_cell_dirs(study_dir))
+        results.append(_make_result(stage, ncells, _count_files(join(bench_root, 'sims')), scnds))
+
+    # cells remain from make_grid_cell_sims
+    # =====================================
+    cell_dirs = _list_cell_dirs(study_dir)
+    form.w_spin_save.setChecked(True)
+    start_time = time()
+    adjust_model_switches_files(form)
+    results.append(_make_result('adjust_model_switches_files', len(cell_dirs), len(cell_dirs), time() - start_time))
+
+    if isdir(spin_dir):
+        rmtree(spin_dir)
+    spinup_lines = ''.join('{:.6e}\n'.format(iline * 1.5) for iline in range(SPINUP_NLINES))
+    for cell_dir in cell_dirs:
+        with open(join(cell_dir, 'spinup.dat'), 'w') as fspin:
+            fspin.write(spinup_lines)
+    form.w_spin_dir.setText(spin_dir)
+    start_time = time()
+    move_spinup_files(form)
+    results.append(_make_result('move_spinup_files', len(cell_dirs), _count_files(spin_dir), time() - start_time))
+
+    _report_results(results)
+    if results_fn is not None:
+        with open(results_fn, 'a') as fresults:
+            for result in results:
+                fresults.write(json_dumps(dict(result, bench_root=bench_root, ovrrds=ovrrds)) + '\n')
+        print('Appended results to ' + results_fn)
+
+    return results
+
+def _fetch_central_bbox(drvr):
+    """
+    return longitude and latitude of the lower left and upper right corners of the middle half of the world in
+    each direction
+    """
+    bng_x_min, bng_x_max, bng_y_min, bng_y_max = [int(val) for val in drvr.fetch_extent()]
+    east_qrtr, nrth_qrtr = (bng_x_max - bng_x_min) // 4, (bng_y_max - bng_y_min) // 4
+    lons, lats = OSGB36toWGS84_arrays([bng_x_min + east_qrtr, bng_x_max - east_qrtr],
+                                                                    [bng_y_min + nrth_qrtr, bng_y_max - nrth_qrtr])
+    return [lons[0].item(), lats[0].item(), lons[1].item(), lats[1].item()]
+
+def _list_cell_dirs(study_dir):
+    """
+    C
+    """
+    if not isdir(study_dir):
+        return []
+
+    return [entry.path for entry in scandir(study_dir) if entry.is_dir(follow_symlinks=False)]
+
+def _count_files(dirn):
+    """
+    number of files in the tree below dirn, links are counted but not followed
+    """
+    nfiles = 0
+    for entry in scandir(dirn):
+        if entry.is_dir(follow_symlinks=False):
+            nfiles += _count_files(entry.path)
+        else:
+            nfiles += 1
+
+    return nfiles
+
+def _make_result(stage, ncells, nfiles, scnds):
+    """
+    C
+    """
+    return {'stage': stage, 'ncells': ncells, 'nfiles': nfiles, 'seconds': round(scnds, 3),
+            'cells_per_sec': round(ncells / scnds, 1) if scnds > 0 else None,
+            'files_per_sec': round(nfiles / scnds, 1) if scnds > 0 else None}
+
+def _report_results(results):
+    """
+    C
+    """
+    print('\n{:<30s}{:>10s}{:>10s}{:>12s}{:>12s}{:>12s}'.format('stage', 'cells', 'files', 'seconds', 'cells/s',
+                                                                                                        'files/s'))
+    for result in results:
+        print('{:<30s}{:>10d}{:>10d}{:>12.2f}{:>12.1f}{:>12.1f}'.format(result['stage'], result['ncells'],
+                    result['nfiles'], result['seconds'], result['cells_per_sec'] or 0, result['files_per_sec'] or 0))
+    return
+
+def _parse_args(argv):
+    """
+    C
+    """
+    parser = ArgumentParser(prog=__prog__, description='Build synthetic worlds and time the generation pipeline')
+    sub_parsers = parser.add_subparsers(dest='command', required=True)
+
+    make_parser = sub_parsers.add_parser('make', help='write a synthetic world')
+    make_parser.add_argument('bench_root', help='directory in which to write the world')
+    make_parser.add_argument('size', help='number of land cells or one of ' + ', '.join(BENCH_SIZES))
+    make_parser.add_argument('--seed', type=int, default=1, help='seed of the random number generator')
+
+    run_parser = sub_parsers.add_parser('run', help='time the generation pipeline over a world')
+    run_parser.add_argument('bench_root', help='directory of a world written by make')
+    run_parser.add_argument('--n_workers', type=int, help='number of worker processes')
+    run_parser.add_argument('--n_writers', type=int, help='number of background threads writing cell files')
+    run_parser.add_argument('--wthr_link_mode', choices=WTHR_LINK_MODES,
+                                                            help='how weather files are placed in the sims tree')
+    run_parser.add_argument('--stage_timers', action='store_true', help='report time taken by each stage')
+    run_parser.add_argument('--shared_mdl_swtchs', action='store_true',
+                                                    help='link each cell to a Model_Switches file shared by the study')
+    run_parser.add_argument('--results', help='file to which results are appended as lines of JSON')
+
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    returns 0 on success, 1 otherwise
+    """
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+
+    if args.command == 'make':
+        ncells = BENCH_SIZES.get(args.size)
+        if ncells is None:
+            try:
+                ncells = int(args.size)
+            except ValueError:
+                print(ERROR_STR + 'size must be an integer or one of ' + ', '.join(BENCH_SIZES))
+                return 1
+        make_bench_world(args.bench_root, ncells, args.seed)
+        return 0
+
+    ovrrds = {key: getattr(args, key) for key in ['n_workers', 'n_writers', 'wthr_link_mode']
+                                                                                if getattr(args, key) is not None}
+    if args.stage_timers:
+        ovrrds['stage_timers_flag'] = True
+    if args.shared_mdl_swtchs:
+        ovrrds['shared_mdl_swtchs_flag'] = True
+
+    results = run_benchmarks(args.bench_root, ovrrds, args.results)
+
+    return 0 if len(results) > 0 else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+#-------------------------------------------------------------------------------
+# Name:        cvrtcoord_arrays.py
+# Purpose:     array counterparts of the Hannah Fry coordinate conversion functions in cvrtcoord
+# Author:      Mike Martin
+# Created:     18/10/2026
+# Licence:     <your licence>
+# Description: each function takes and returns NumPy arrays and follows the arithmetic of its scalar counterpart
+#              step by step; the iterative steps are only applied to points which have not yet converged
+#-------------------------------------------------------------------------------
+#
+__prog__ = 'cvrtcoord_arrays.py'
+__version__ = '0.0.1'
+__author__ = 's03mm5'
+
+from math import pi
+from numpy import asarray, float64, full, zeros, sqrt, sin, cos, tan, arctan2
+
+# Airy 1830 ellipsoid and National Grid projection
+# ================================================
+A_AIRY, B_AIRY = 6377563.396, 6356256.909
+F0 = 0.9996012717
+LAT0 = 49*pi/180
+LON0 = -2*pi/180
+N0, E0 = -100000, 400000
+
+# GRS80 ellipsoid
+# ===============
+A_GRS80, B_GRS80 = 6378137.000, 6356752.3141
+
+def _meridional_arc(lat, a, b):
+    """
+    meridional arc M for latitudes lat on ellipsoid with semi-axes a and b
+    """
+    n = (a-b)/(a+b)
+    M1 = (1 + n + (5./4)*n**2 + (5./4)*n**3) * (lat-LAT0)
+    M2 = (3*n + 3*n**2 + (21./8)*n**3) * sin(lat-LAT0) * cos(lat+LAT0)
+    M3 = ((15./8)*n**2 + (15./8)*n**3) * sin(2*(lat-LAT0)) * cos(2*(lat+LAT0))
+    M4 = (35./24)*n**3 * sin(3*(lat-LAT0)) * cos(3*(lat+LAT0))
+
+    return b * F0 * (M1 - M2 + M3 - M4)
+
+def _helmert(x_1, y_1, z_1, s, tx, ty, tz, rxs, rys, rzs):
+    """
+    Helmert transformation of cartesian coordinates, rotations rxs, rys, rzs in seconds
+    """
+    rx, ry, rz = rxs*pi/(180*3600.), rys*pi/(180*3600.), rzs*pi/(180*3600.)
+    x_2 = tx + (1+s)*x_1 + (-rz)*y_1 + (ry)*z_1
+    y_2 = ty + (rz)*x_1 + (1+s)*y_1 + (-rx)*z_1
+    z_2 = tz + (-ry)*x_1 + (rx)*y_1 + (1+s)*z_1
+
+    return x_2, y_2, z_2
+
+def _cartesian_to_lat_lon(x_2, y_2, z_2, a, b):
+    """
+    iterate latitude on ellipsoid with semi-axes a and b until each point converges
+    returns latitudes, longitudes in radians and the final nu
+    """
+    e2 = 1 - (b*b)/(a*a)
+    p = sqrt(x_2**2 + y_2**2)
+    lat = arctan2(z_2, (p*(1-e2)))
+    latold = full(lat.shape, 2*pi)
+    nu = zeros(lat.shape)
+
+    actv = abs(lat - latold) > 10**-16
+    while actv.any():
+        latold[actv] = lat[actv]
+        nu[actv] = a/sqrt(1-e2*sin(latold[actv])**2)
+        lat[actv] = arctan2(z_2[actv] + e2*nu[actv]*sin(latold[actv]), p[actv])
+        actv = abs(lat - latold) > 10**-16
+
+    lon = arctan2(y_2, x_2)
+
+    return lat, lon, nu
+
+def OSGB36toWGS84_arrays(eastngs, nrthngs):
+    """
+    array counterpart of cvrtcoord.OSGB36toWGS84 - returns arrays of longitudes and latitudes in decimal degrees
+    """
+    E = asarray(eastngs, dtype=float64)
+    N = asarray(nrthngs, dtype=float64)
+
+    a, b = A_AIRY, B_AIRY
+    e2 = 1 - (b*b)/(a*a)
+
+    # initialise latitude and meridional arc then iterate until each point is accurate to 0.01mm
+    # ==========================================================================================
+    lat = full(E.shape, LAT0)
+    M = zeros(E.shape)
+    actv = N - N0 - M >= 0.00001
+    while actv.any():
+        lat[actv] = (N[actv] - N0 - M[actv])/(a*F0) + lat[actv]
+        M[actv] = _meridional_arc(lat[actv], a, b)
+        actv = N - N0 - M >= 0.00001
+
+    nu = a*F0/sqrt(1-e2*sin(lat)**2)
+    rho = a*F0*(1-e2)*(1-e2*sin(lat)**2)**(-1.5)
+    eta2 = nu/rho-1
+
+    secLat = 1./cos(lat)
+    VII = tan(lat)/(2*rho*nu)
+    VIII = tan(lat)/(24*rho*nu**3)*(5+3*tan(lat)**2+eta2-9*tan(lat)**2*eta2)
+    IX = tan(lat)/(720*rho*nu**5)*(61+90*tan(lat)**2+45*tan(lat)**4)
+    X = secLat/nu
+    XI = secLat/(6*nu**3)*(nu/rho+2*tan(lat)**2)
+    XII = secLat/(120*nu**5)*(5+28*tan(lat)**2+24*tan(lat)**4)
+    XIIA = secLat/(5040*nu**7)*(61+662*tan(lat)**2+1320*tan(lat)**4+720*tan(lat)**6)
+    dE = E-E0
+
+    # latitude and longitude on the Airy 1830 ellipsoid
+    # =================================================
+    lat_1 = lat - VII*dE**2 + VIII*dE**4 - IX*dE**6
+    lon_1 = LON0 + X*dE - XI*dE**3 + XII*dE**5 - XIIA*dE**7
+
+    # convert to cartesian coordinates then apply Helmert transformation to GRS80
+    # ===========================================================================
+    H = 0
+    x_1 = (nu/F0 + H)*cos(lat_1)*cos(lon_1)
+    y_1 = (nu/F0 + H)*cos(lat_1)*sin(lon_1)
+    z_1 = ((1-e2)*nu/F0 + H)*sin(lat_1)
+
+    x_2, y_2, z_2 = _helmert(x_1, y_1, z_1, -20.4894*10**-6, 446.448, -125.157, + 542.060, 0.1502, 0.2470, 0.8421)
+
+    lat, lon, nu_2 = _cartesian_to_lat_lon(x_2, y_2, z_2, A_GRS80, B_GRS80)
+
+    return lon*180/pi, lat*180/pi
+
+def WGS84toOSGB36_arrays(lons, lats):
+    """
+    array counterpart of cvrtcoord.WGS84toOSGB36 - returns arrays of eastings and northings in metres
+    """
+    lat_1 = asarray(lats, dtype=float64)*pi/180
+    lon_1 = asarray(lons, dtype=float64)*pi/180
+
+    # convert to cartesian coordinates then apply Helmert transformation to Airy 1830
+    # ===============================================================================
+    a_1, b_1 = A_GRS80, B_GRS80
+    e2_1 = 1 - (b_1*b_1)/(a_1*a_1)
+    nu_1 = a_1/sqrt(1-e2_1*sin(lat_1)**2)
+
+    H = 0
+    x_1 = (nu_1 + H)*cos(lat_1)*cos(lon_1)
+    y_1 = (nu_1 + H)*cos(lat_1)*sin(lon_1)
+    z_1 = ((1-e2_1)*nu_1 + H)*sin(lat_1)
+
+    x_2, y_2, z_2 = _helmert(x_1, y_1, z_1, 20.4894*10**-6, -446.448, 125.157, -542.060, -0.1502, -0.2470, -0.8421)
+
+    a, b = A_AIRY, B_AIRY
+    e2 = 1 - (b*b)/(a*a)
+    lat, lon, nu = _cartesian_to_lat_lon(x_2, y_2, z_2, a, b)
+
+    # project onto the National Grid
+    # ==============================
+    rho = a*F0*(1-e2)*(1-e2*sin(lat)**2)**(-1.5)
+    eta2 = nu*F0/rho-1
+    M = _meridional_arc(lat, a, b)
+
+    I = M + N0
+    II = nu*F0*sin(lat)*cos(lat)/2
+    III = nu*F0*sin(lat)*cos(lat)**3*(5 - tan(lat)**2 + 9*eta2)/24
+    IIIA = nu*F0*sin(lat)*cos(lat)**5*(61 - 58*tan(lat)**2 + tan(lat)**4)/720
+    IV = nu*F0*cos(lat)
+    V = nu*F0*cos(lat)**3*(nu/rho - tan(lat)**2)/6
+    VI = nu*F0*cos(lat)**5*(5 - 18*tan(lat)**2 + tan(lat)**4 + 14*eta2 - 58*eta2*tan(lat)**2)/120
+
+    N = I + II*(lon-LON0)**2 + III*(lon-LON0)**4 + IIIA*(lon-LON0)**6
+    E = E0 + IV*(lon-LON0) + V*(lon-LON0)**3 + VI*(lon-LON0)**5
+
+    return E, N
@@ -0,0 +1,227 @@
+#-------------------------------------------------------------------------------
+# Name:        ecosse_scheduler.py
+# Purpose:     run the ECOSSE executable over the cells of a study using several concurrent processes
+# Author:      Mike Martin
+# Created:     18/10/2026
+# Licence:     <your licence>
+# Description: usage: python ecosse_scheduler.py study_dir exepath [n_workers [timeout]]
+#              a cell is a directory of the study comprising an input.txt file; for each cell the ECOSSE executable
+#              is run in the cell directory with input.txt as standard input and its output written to
+#              ecosse_stdout.txt in the same directory
+#              a run which takes longer than timeout seconds, if positive, is killed and the cell reported as failed
+#              the exit status and run time of every cell are written to ecosse_run_status.txt in the study directory
+#              only exepath is taken from the run sites configuration file; to honour its other settings run the
+#              run sites script instead by setting ecosse_launch_mode to runsites, see launch_ecosse
+#-------------------------------------------------------------------------------
+#
+__prog__ = 'ecosse_scheduler.py'
+__version__ = '0.0.1'
+__author__ = 's03mm5'
+
+import sys
+from os import scandir, cpu_count
+from os.path import join, isfile, isdir, abspath, dirname
+from json import load as json_load
+from subprocess import run, Popen, STDOUT, TimeoutExpired
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from time import time
+
+from headless_fns import process_events
+
+INPUT_FN = 'input.txt'
+STDOUT_FN = 'ecosse_stdout.txt'
+STATUS_FN = 'ecosse_run_status.txt'
+PRGRSS_INTRVL = 5       # seconds between progress reports
+TIMEOUT_CODE = -2       # exit status recorded for a cell whose run was killed on timeout
+
+ECOSSE_LAUNCH_MODES = ['scheduler', 'runsites']     # ways of running ECOSSE over a study, see launch_ecosse
+SCHDLR_CNFG_KEYS = ['exepath', 'sims_dir']   # Simulations settings of the run sites file honoured by the scheduler
+
+WARN_STR = '*** Warning *** '
+ERROR_STR = '*** Error *** '
+
+def fetch_ecosse_exe(runsites_cnfg_fn):
+    """
+    return path of the ECOSSE executable named in the run sites configuration file or None
+    """
+    try:
+        with open(runsites_cnfg_fn, 'r') as fcnfg:
+            config = json_load(fcnfg)
+        exepath = config['Simulations']['exepath']
+    except (OSError, ValueError, KeyError) as err:
+        print(ERROR_STR + 'could not read ECOSSE executable from run sites file ' + runsites_cnfg_fn + ' - ' + str(err))
+        return None
+
+    if not isfile(exepath):
+        print(ERROR_STR + 'ECOSSE executable ' + exepath + ' named in ' + runsites_cnfg_fn + ' does not exist')
+        return None
+
+    ignored = sorted(key for key in config['Simulations'] if key not in SCHDLR_CNFG_KEYS)
+    if len(ignored) > 0:
+        print(WARN_STR + 'Simulations settings ' + ', '.join(ignored) + ' of run sites file ' + runsites_cnfg_fn
+                        + ' are not used by the scheduler - set ecosse_launch_mode to runsites if they are needed')
+
+    return exepath
+
+def launch_ecosse(sttngs, study_dir):
+    """
+    start a process which runs ECOSSE over the cells of study_dir and return it without waiting, None on failure
+    according to ecosse_launch_mode this is either this module, using the executable named in the run sites file,
+    or the run sites script
+    """
+    if sttngs['ecosse_launch_mode'] == 'runsites':
+        command_line = [sttngs['python_exe'], sttngs['runsites_py'], sttngs['runsites_cnfg_fn']]
+    else:
+        exepath = fetch_ecosse_exe(sttngs['runsites_cnfg_fn'])
+        if exepath is None:
+            return None
+        command_line = [sys.executable, join(dirname(abspath(__file__)), __prog__), study_dir, exepath,
+                                            str(int(sttngs['n_ecosse_workers'])), str(float(sttngs['ecosse_timeout']))]
+    try:
+        new_inst = Popen(command_line)
+    except OSError as err:
+        print(ERROR_STR + 'could not launch ' + ' '.join(command_line[:2]) + ' - ' + str(err))
+        return None
+
+    print('Launched: ' + ' '.join(command_line[1:]) + ' with process id: ' + str(new_inst.pid))
+
+    return new_inst
+
+def find_cell_dirs(study_dir):
+    """
+    return sorted list of cell names i.e. directories of the study with an input file or None if there is no study
+    directory
+    """
+    if not isdir(study_dir):
+        print(ERROR_STR + 'study directory ' + study_dir + ' does not exist')
+        return None
+
+    return sorted(entry.name for entry in scandir(study_dir)
+                                                    if entry.is_dir() and isfile(join(entry.path, INPUT_FN)))
+
+def run_ecosse_cells(study_dir, exepath, n_workers=0, w_prgrss=None, timeout=0):
+    """
+    run exepath in each cell of study_dir using n_workers concurrent processes, all cores if n_workers is not positive
+    a run which takes longer than timeout seconds, if positive, is killed
+    progress, including throughput in cells per minute, is reported to w_prgrss if supplied
+    returns list of cells whose run failed or None if there is no study directory
+    """
+    cells = find_cell_dirs(study_dir)
+    if cells is None:
+        return None
+    ncells = len(cells)
+    if n_workers <= 0:
+        n_workers = cpu_count()
+    print('Will run ECOSSE executable ' + exepath + ' over {} cells in {} using {} workers'
+                                                                            .format(ncells, study_dir, n_workers))
+    process_events()
+
+    # each worker thread waits on its own ECOSSE process so the number of threads bounds the number of processes
+    # ============================================================================================================
+    start_time = time()
+    last_time = start_time
+    status = {}
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        pending = {executor.submit(_run_cell, exepath, join(study_dir, cell), timeout): cell for cell in cells}
+        while pending:
+            done, not_done = wait(pending, timeout=PRGRSS_INTRVL, return_when=FIRST_COMPLETED)
+            for future in done:
+                status[pending.pop(future)] = future.result()
+
+            new_time = time()
+            if new_time - last_time > PRGRSS_INTRVL:
+                _report_progress(w_prgrss, status, ncells, new_time - start_time)
+                last_time = new_time
+
+    failed = [cell for cell in cells if status[cell][0] != 0]
+    _write_status_file(study_dir, cells, status)
+
+    scnds_elapsed = time() - start_time
+    print('Ran ECOSSE over {} cells of which {} failed in {:.1f} seconds - {:.1f} cells per minute'
+                            .format(ncells, len(failed), scnds_elapsed, _cells_per_min(ncells, scnds_elapsed)))
+    if len(failed) > 0:
+        print(WARN_STR + 'failed cells are listed in ' + join(study_dir, STATUS_FN) + ' e.g. ' + ', '.join(failed[:5]))
+    process_events()
+
+    return failed
+
+def _run_cell(exepath, cell_dir, timeout=0):
+    """
+    return exit status of the ECOSSE run, -1 if it could not be launched or TIMEOUT_CODE if it was killed after
+    timeout seconds, and time taken
+    """
+    start_time = time()
+    try:
+        with open(join(cell_dir, INPUT_FN), 'r') as fstdin, open(join(cell_dir, STDOUT_FN), 'w') as fstdout:
+            ret_code = run([exepath], cwd=cell_dir, stdin=fstdin, stdout=fstdout, stderr=STDOUT,
+                                                                    timeout=timeout if timeout > 0 else None).returncode
+    except TimeoutExpired:
+        print(WARN_STR + 'ECOSSE run in ' + cell_dir + ' killed after {} seconds'.format(timeout))
+        ret_code = TIMEOUT_CODE
+    except OSError as err:
+        print(WARN_STR + 'could not run ECOSSE in ' + cell_dir + ' - ' + str(err))
+        ret_code = -1
+
+    return ret_code, time() - start_time
+
+def _cells_per_min(ncells, scnds_elapsed):
+    """
+    C
+    """
+    return 60 * ncells / scnds_elapsed if scnds_elapsed > 0 else 0.0
+
+def _report_progress(w_prgrss, status, ncells, scnds_elapsed):
+    """
+    C
+    """
+    nfailed = sum(1 for ret_code, scnds in status.values() if ret_code != 0)
+    mess = 'Cells run: {} of {}\tfailed: {}\tcells per minute: {:.1f}'\
+                                .format(len(status), ncells, nfailed, _cells_per_min(len(status), scnds_elapsed))
+    if w_prgrss is None:
+        print(mess)
+    else:
+        w_prgrss.setText(mess)
+    process_events()
+
+    return
+
+def _write_status_file(study_dir, cells, status):
+    """
+    one line per cell: cell name, exit status and seconds taken separated by tabs
+    """
+    status_fn = join(study_dir, STATUS_FN)
+    try:
+        with open(status_fn, 'w') as fstatus:
+            fstatus.write('cell\texit_status\tseconds\n')
+            for cell in cells:
+                ret_code, scnds = status[cell]
+                fstatus.write('{}\t{}\t{:.2f}\n'.format(cell, ret_code, scnds))
+    except OSError as err:
+        print(WARN_STR + 'could not write ' + status_fn + ' - ' + str(err))
+
+    return
+
+def main(argv=None):
+    """
+    run ECOSSE over the cells of the study directory given on the command line
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if len(argv) not in (2, 3, 4):
+        print('usage: python ' + __prog__ + ' study_dir exepath [n_workers [timeout]]')
+        return 1
+
+    study_dir, exepath = argv[:2]
+    if not isfile(exepath):
+        print(ERROR_STR + 'ECOSSE executable ' + exepath + ' does not exist')
+        return 1
+
+    n_workers = int(argv[2]) if len(argv) >= 3 else 0
+    timeout = float(argv[3]) if len(argv) == 4 else 0
+    failed = run_ecosse_cells(study_dir, exepath, n_workers, timeout=timeout)
+
+    return 0 if failed is not None and len(failed) == 0 else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
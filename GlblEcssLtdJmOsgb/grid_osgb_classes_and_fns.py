@@ -10,16 +10,26 @@
 __prog__ = 'grid_osgb_classes_and_fns.py'
 __author__ = 's03mm5'
 
-from os import makedirs, listdir
-from os.path import isdir, join, isfile
+from os import makedirs, listdir, stat, scandir, replace, remove, getpid
+from os.path import isdir, join, isfile, basename, dirname, abspath
 from glob import glob
 from math import floor, ceil
 from calendar import month_abbr
-
-from pandas import read_csv
-from PyQt5.QtWidgets import QApplication
-
-from cvrtcoord import  WGS84toOSGB36
+from functools import lru_cache
+from time import time
+
+from numpy import ascontiguousarray, array_equal, unique, bytes_, float32, float64, int8, int32, int64, iinfo
+from numpy import array, full, maximum, char, load as np_load, savez as np_savez
+from zipfile import BadZipFile
+from pandas import read_csv, concat
+from pandas.api.types import is_integer_dtype
+from headless_fns import process_events
+
+from cvrtcoord_arrays import OSGB36toWGS84_arrays, WGS84toOSGB36_arrays
+from lta_pack_fns import fetch_lta_pack, install_lta_pack, parse_lta_csv, make_lta_dict
+from pi_pack_fns import fetch_pi_pack, install_pi_pack
+from spin_archive_fns import count_spinups
+from stage_timers import stage_timer
 
 ERROR_STR = '*** Error *** '
 WARN_STR = '*** Warning *** '
@@ -30,6 +40,17 @@ LTA_STRT_YR, LTA_END_YR = (1988, 2018)
 SPECIES = {'sitka_spruce': 'SS'}
 
 N_CELLS_MAX_DFLT = 10
+LTA_CACHE_SIZE = 50000    # maximum number of parsed LTA files retained
+
+DRVR_CACHE_SFFX = '.cache.npz'    # driver cache is written alongside the driver file - see _read_drvr_cache
+DRVR_CACHE_VRSN = 2               # increment when the attributes of HwsdDrvrArrays change
+
+_invntry = {'dir_uids': {}}    # most recent directory inventory - see make_dir_inventory
+
+# soil metrics in the order required for soil_rec: topsoil then subsoil
+# ====================================================================
+SOIL_METRICS = ['S_soc_kg_ha', 'S_BULK_DENSITY', 'S_PH_H2O', 'S_CLAY', 'S_SAND', 'S_SILT',
+                'T_soc_kg_ha', 'T_BULK_DENSITY', 'T_PH_H2O', 'T_CLAY', 'T_SAND', 'T_SILT']
 
 def fetch_dir_locations(form):
     """
@@ -51,18 +72,18 @@ def fetch_dir_locations(form):
         form.sttngs['plnt_inpt_dir'] = plnt_inpt_dir
     else:
         print(WARN_STR + 'plant input directory ' + plnt_inpt_dir + ' does not exist')
-        QApplication.processEvents()
+        process_events()
         return
 
     return lta_dir, rcp_dir, rcp_realis, plnt_inpt_dir, n_cells_max
 
 def report_spin_dir(form, spin_dir):
     """
-    report spinup files - no longer used
+    report number of spinup files - taken from the index of the spinup archive if there is one
     """
     form.w_create_files.setEnabled(True)
     if isdir(spin_dir):
-        nspins = len(glob(join(spin_dir, 'spinup_*.dat')))
+        nspins = count_spinups(spin_dir)
         if form.sttngs['run_sims_flag']:
             form.w_create_files.setEnabled(True)
     else:
@@ -71,40 +92,74 @@ def report_spin_dir(form, spin_dir):
 
     form.w_spin_dtls.setText('Spinup files: ' + f'{nspins:,d}' + '\t\t')
 
-    QApplication.processEvents()
+    process_events()
 
     return
 
 def report_pi_csvs(form, pi_dir):
     """
-    report PI CSVs
+    report PI CSVs or, if the PI directory has been packed, the number of packed cells
     """
-    ncsvs = len(glob(join(pi_dir, '*.csv')))
-    form.w_pi_csvs.setText('PI CSVs: ' + f'{ncsvs:,d}' + '\t\t')
+    pi_pack = fetch_pi_pack(pi_dir)
+    if pi_pack is None:
+        ncsvs = len(glob(join(pi_dir, '*.csv')))
+        form.w_pi_csvs.setText('PI CSVs: ' + f'{ncsvs:,d}' + '\t\t')
+    else:
+        ncsvs = len(pi_pack)
+        form.w_pi_csvs.setText('PI cells (packed): ' + f'{ncsvs:,d}' + '\t\t')
     if ncsvs == 0:
         form.w_create_files.setEnabled(False)
     else:
         form.w_create_files.setEnabled(True)
 
-    QApplication.processEvents()
+    process_events()
 
     return
 
 def make_hwsd_drvr_df(form, hwsd_drvr_data_fn):
     """
      read CSV HWSD driver file using pandas
+     if setting drvr_chunk_size is positive the driver file is instead streamed in chunks - see HwsdDrvrStream
     """
     if isfile(hwsd_drvr_data_fn):
         print('\nCreating dataframe from CSV HWSD driver file:\n\t' + hwsd_drvr_data_fn)
-        QApplication.processEvents()
+        process_events()
     else:
         form.hwsd_drvr_data = None
         print(WARN_STR + 'HWSD driver file ' + hwsd_drvr_data_fn + ' does not exist')
-        QApplication.processEvents()
+        process_events()
         return
 
-    hwsd_drvr_data = read_csv(hwsd_drvr_data_fn, sep = ',')
-    nrecs, nmetrics = hwsd_drvr_data.shape
+    chunk_size = int(form.sttngs['drvr_chunk_size'])
+    if chunk_size > 0:
+        _make_hwsd_drvr_stream(form, hwsd_drvr_data_fn, chunk_size)
+        return
+
+    # use cache of the driver records if it is up to date
+    # ===================================================
+    cache_flag = form.sttngs['drvr_cache_flag']
+    if cache_flag:
+        cache_fn = hwsd_drvr_data_fn + DRVR_CACHE_SFFX
+        cache_key = _fetch_drvr_cache_key(hwsd_drvr_data_fn)
+        cache_rec = _read_drvr_cache(cache_fn, cache_key)
+        if cache_rec is not None:
+            drvr, bbox, nmetrics = cache_rec
+            nrecs = len(drvr)
+            form.w_hwsd_drvr_fn.setText(hwsd_drvr_data_fn)
+            form.w_drvr_dtls.setText('Records: ' + f'{nrecs:,d}' + '\t\t')
+            form.w_bbox.setText(bbox)
+            form.hwsd_drvr_data = drvr
+            print('Read ' + f'{nrecs:,d}' + ' records and ' + f'{nmetrics:,d}' + ' metrics from driver cache '
+                                                                                                        + cache_fn)
+            process_events()
+            return
+
+    # only columns required for generation are read - see HwsdDrvrArrays
+    # ==================================================================
+    hdr = read_csv(hwsd_drvr_data_fn, sep = ',', nrows=0).columns.tolist()
+    metrics = ['UID', 'BNG_X', 'BNG_Y', _fetch_lu_metric(hdr)] + SOIL_METRICS
+    hwsd_drvr_data = read_csv(hwsd_drvr_data_fn, sep = ',', usecols=[metric for metric in metrics if metric in hdr])
+    nrecs, nmetrics = len(hwsd_drvr_data), len(hdr)
     form.w_hwsd_drvr_fn.setText(hwsd_drvr_data_fn)
     form.w_drvr_dtls.setText('Records: ' + f'{nrecs:,d}' + '\t\t')
 
@@ -115,19 +170,111 @@ def make_hwsd_drvr_df(form, hwsd_drvr_data_fn):
         bbox += 'northing extent {} {}: '.format(bng_y.min(), bng_y.max())
         form.w_bbox.setText(bbox)
 
-        form.hwsd_drvr_data = hwsd_drvr_data
-        print('Created dataframe with ' + f'{nrecs:,d}' + ' records and ' + f'{nmetrics:,d}' + ' metrics ')
+        try:
+            form.hwsd_drvr_data = HwsdDrvrArrays(hwsd_drvr_data)
+        except KeyError as err:
+            print(WARN_STR + 'Invalid driver file: column ' + str(err) + ' must be present')
+            form.hwsd_drvr_data = None
+        else:
+            print('Created dataframe with ' + f'{nrecs:,d}' + ' records and ' + f'{nmetrics:,d}' + ' metrics ')
+            df_mb = hwsd_drvr_data.memory_usage(deep=True).sum()/1024**2
+            print('Driver records occupy {:.1f} MB compared with {:.1f} MB as a dataframe of the required columns'
+                                                            .format(form.hwsd_drvr_data.nbytes()/1024**2, df_mb))
+            if cache_flag:
+                _write_drvr_cache(cache_fn, cache_key, form.hwsd_drvr_data, bbox, nmetrics)
     else:
         print(WARN_STR + 'Invalid driver file: columns BNG_X and BNG_Y must be present')
         form.hwsd_drvr_data = None
 
-    QApplication.processEvents()
+    process_events()
+
+    return
+
+def _fetch_drvr_cache_key(hwsd_drvr_data_fn):
+    """
+    the cache is valid for this path, size and modification time of the driver file
+    """
+    stat_rec = stat(hwsd_drvr_data_fn)
+
+    return [DRVR_CACHE_VRSN, abspath(hwsd_drvr_data_fn), stat_rec.st_size, stat_rec.st_mtime_ns]
+
+def _read_drvr_cache(cache_fn, cache_key):
+    """
+    returns HwsdDrvrArrays, extent text and number of metrics or None if the cache is absent, stale or unreadable
+    """
+    if not isfile(cache_fn):
+        return None
+
+    try:
+        with np_load(cache_fn) as cache:
+            if cache['cache_key'].tolist() != [str(val) for val in cache_key]:
+                print('Driver cache ' + cache_fn + ' is out of date and will be regenerated')
+                return None
+
+            drvr = HwsdDrvrArrays.__new__(HwsdDrvrArrays)
+            for attr in HwsdDrvrArrays.ARRAY_ATTRS:
+                setattr(drvr, attr, cache[attr])
+            drvr.set_scalars(cache['soil_int_indxs'].tolist())
+            bbox = cache['bbox'].item()
+            nmetrics = cache['nmetrics'].item()
+
+    except (OSError, ValueError, KeyError, BadZipFile) as err:
+        print(WARN_STR + 'could not read driver cache ' + cache_fn + ' - ' + str(err))
+        return None
+
+    return drvr, bbox, nmetrics
+
+def _write_drvr_cache(cache_fn, cache_key, drvr, bbox, nmetrics):
+    """
+    write via a temporary file so that an interrupted write cannot leave a partial cache
+    """
+    tmp_fn = cache_fn + '.' + str(getpid()) + '.npz'
+    arrays = {attr: getattr(drvr, attr) for attr in HwsdDrvrArrays.ARRAY_ATTRS}
+    try:
+        np_savez(tmp_fn, cache_key=array([str(val) for val in cache_key]), bbox=array(bbox), nmetrics=array(nmetrics),
+                                            soil_int_indxs=array(drvr.soil_int_indxs, dtype=int64), **arrays)
+        replace(tmp_fn, cache_fn)
+    except OSError as err:
+        print(WARN_STR + 'could not write driver cache ' + cache_fn + ' - ' + str(err))
+        if isfile(tmp_fn):
+            remove(tmp_fn)
+    else:
+        print('Wrote driver cache ' + cache_fn)
+
+    return
+
+def _make_hwsd_drvr_stream(form, hwsd_drvr_data_fn, chunk_size):
+    """
+    counterpart of make_hwsd_drvr_df which scans the driver file once to report its records and extent
+    """
+    try:
+        drvr = HwsdDrvrStream(hwsd_drvr_data_fn, chunk_size)
+    except KeyError as err:
+        print(WARN_STR + 'Invalid driver file: column ' + str(err) + ' must be present')
+        form.hwsd_drvr_data = None
+        process_events()
+        return
+
+    nrecs = len(drvr)
+    form.w_hwsd_drvr_fn.setText(hwsd_drvr_data_fn)
+    form.w_drvr_dtls.setText('Records: ' + f'{nrecs:,d}' + '\t\t')
+
+    bng_x_min, bng_x_max, bng_y_min, bng_y_max = drvr.extent
+    bbox = 'easting extent: {} {}\t'.format(bng_x_min, bng_x_max)
+    bbox += 'northing extent {} {}: '.format(bng_y_min, bng_y_max)
+    form.w_bbox.setText(bbox)
+
+    form.hwsd_drvr_data = drvr
+    print('Will stream ' + f'{nrecs:,d}' + ' records in ' + f'{len(drvr.offsets):,d}' + ' chunks of up to '
+                                                                            + f'{chunk_size:,d}' + ' records')
+    process_events()
 
     return
 
 def fetch_ncells_aoi(form):
     """
-    use bounding box to calculate number of grid cells
+    use bounding box to calculate number of grid cells and select the driver records within it from the grid index
+    returns number of grid cells, driver records and positions of the selected records in north then east order
     """
     lon_ll = float(form.w_ll_lon.text())
     lat_ll = float(form.w_ll_lat.text())
@@ -135,72 +282,221 @@ def fetch_ncells_aoi(form):
     lat_ur = float(form.w_ur_lat.text())
     form.sttngs['bbox'] = list([lon_ll, lat_ll, lon_ur, lat_ur])
 
-    # use Hannah Fry functions to generate AOI coordinates
-    # ====================================================
-    eastng_ll, nrthng_ll = WGS84toOSGB36(lon_ll, lat_ll)
+    # use Hannah Fry functions to generate AOI coordinates - both corners in one call
+    # ===============================================================================
+    eastngs, nrthngs = WGS84toOSGB36_arrays([lon_ll, lon_ur], [lat_ll, lat_ur])
+    eastng_ll, eastng_ur = eastngs.tolist()
+    nrthng_ll, nrthng_ur = nrthngs.tolist()
     east_ll = 1000 * floor(eastng_ll / 1000) - 500
     nrth_ll = 1000 * floor(nrthng_ll / 1000) - 500
 
-    eastng_ur, nrthng_ur = WGS84toOSGB36(lon_ur, lat_ur)
     east_ur = 1000 * ceil(eastng_ur / 1000) + 500
     nrth_ur = 1000 * ceil(nrthng_ur / 1000) + 500
 
-    ngrid_cells = int(((nrth_ur - nrth_ll) / 1000 - 1) * ((east_ur - east_ll) / 1000 - 1))
-    print('Will process AOI comprising: {} cells'.format(ngrid_cells))
-    QApplication.processEvents()
+    # grid cells are those from east_ll and nrth_ll up to, but excluding, east_ur and nrth_ur
+    # =======================================================================================
+    ngrid_cells = ((nrth_ur - nrth_ll) // 1000) * ((east_ur - east_ll) // 1000)
+    drvr, bbox_irows = form.hwsd_drvr_data.fetch_bbox_subset(east_ll, east_ur, nrth_ll, nrth_ur)
+    print('Will process AOI comprising: {} cells of which {} are in the driver file'
+                                                                        .format(ngrid_cells, len(bbox_irows)))
+    process_events()
 
-    return ngrid_cells, nrth_ur, nrth_ll, east_ur, east_ll
+    return ngrid_cells, drvr, bbox_irows
 
-def fetch_cell_ecss_data(ltd_data, lta_csv, rcp_dir, plnt_inpt_dir, coord, rec, empty_lta, built_up, no_plnt_inpt):
+def fetch_cell_ecss_data(ltd_data, lta_csv, rcp_dir, plnt_inpt_dir, coord, drvr, irow, cntrs):
     """
-     rec is a dataframe
+     drvr is a HwsdDrvrArrays object and irow the position of the cell record
+     cntrs is a dictionary of rejected cell counts with keys built_up, empty_lta and no_plnt_inpt
     """
     soil_rec = None
     yrs_pi = None
     wthr_dir = None
-    if isfile(lta_csv):
-        if _check_lta_file(lta_csv):
+    with stage_timer('lta_check'):
+        valid_flag = _check_lta_file(lta_csv)
+    if valid_flag is not None:
+        if valid_flag:
             wthr_dir = join(rcp_dir, coord)
-            if isdir(wthr_dir):
-                ecss_lu, soil_rec = _fetch_hwsd_data_from_rec(rec)
+            with stage_timer('wthr_dir_check'):
+                wthr_flag = _is_wthr_dir(rcp_dir, coord)
+            if wthr_flag:
+                with stage_timer('soil_rec'):
+                    ecss_lu, soil_rec = drvr.fetch_hwsd_data(irow)
                 if ecss_lu == 0:
-                    built_up += 1
+                    cntrs['built_up'] += 1
                 else:
-                    plnt_inpt_csv = join(plnt_inpt_dir, coord + '.csv')
-                    if isfile(plnt_inpt_csv):
-                        yrs_pi = _read_plnt_inpt_csv_file(plnt_inpt_csv)
-                        ltd_data.add_lus_and_pis(ecss_lu, yrs_pi)
+                    with stage_timer('pi_read'):
+                        yrs_pi = _fetch_plnt_inpt(plnt_inpt_dir, coord)
+                    if yrs_pi is None:
+                        cntrs['no_plnt_inpt'] += 1
                     else:
-                        no_plnt_inpt += 1
+                        ltd_data.add_lus_and_pis(ecss_lu, yrs_pi)
         else:
-            empty_lta += 1
+            cntrs['empty_lta'] += 1
 
     return soil_rec, yrs_pi, wthr_dir
 
+def make_dir_inventory(lta_dir, rcp_dir, plnt_inpt_dir):
+    """
+    list the LTA, weather and plant input directories once so that checks for the presence of a cell's files
+    become set lookups rather than file system requests - a directory which has been packed is not listed
+    LTA files are listed with their modification times which form part of the key of the LTA cache
+    packs are validated here and the outcome carried by the inventory so that worker processes do not repeat the
+    validation, which requires a listing of the packed directory
+    returns the inventory so that it can be installed in worker processes - see install_dir_inventory
+    """
+    start_time = time()
+    dir_uids = {}
+    lta_pack_flag = fetch_lta_pack(lta_dir) is not None
+    if not lta_pack_flag:
+        dir_uids[lta_dir] = _scan_dir_uids(lta_dir, '.csv', mtime_flag=True)
+    dir_uids[rcp_dir] = _scan_dir_uids(rcp_dir)
+    pi_pack_flag = fetch_pi_pack(plnt_inpt_dir) is not None
+    if not pi_pack_flag:
+        dir_uids[plnt_inpt_dir] = _scan_dir_uids(plnt_inpt_dir, '.csv')
+
+    invntry = {'dir_uids': dir_uids, 'lta_packs': {lta_dir: lta_pack_flag}, 'pi_packs': {plnt_inpt_dir: pi_pack_flag}}
+    install_dir_inventory(invntry)
+
+    mess = 'Inventory of input directories taken in {:.1f} seconds - '.format(time() - start_time)
+    mess += 'weather directories: {}'.format(len(dir_uids[rcp_dir]))
+    for dir_path, descr in zip([lta_dir, plnt_inpt_dir], ['LTA files', 'plant input files']):
+        if dir_path in dir_uids:
+            mess += '\t' + descr + ': {}'.format(len(dir_uids[dir_path]))
+        else:
+            mess += '\t' + descr + ': packed'
+    print(mess)
+    process_events()
+
+    return invntry
+
+def install_dir_inventory(invntry):
+    """
+    replace the current inventory and adopt its validated packs
+    """
+    _invntry['dir_uids'] = invntry['dir_uids']
+    for lta_dir, pack_flag in invntry['lta_packs'].items():
+        install_lta_pack(lta_dir, pack_flag)
+    for plnt_inpt_dir, pack_flag in invntry['pi_packs'].items():
+        install_pi_pack(plnt_inpt_dir, pack_flag)
+
+    return
+
+def _scan_dir_uids(dir_path, sffx=None, mtime_flag=False):
+    """
+    return set of UIDs of files with suffix sffx in dir_path or, if sffx is None, of sub-directories
+    if mtime_flag is set return instead a dictionary of the modification time of each file keyed by UID
+    """
+    if not isdir(dir_path):
+        print(WARN_STR + 'directory ' + dir_path + ' does not exist')
+        return {} if mtime_flag else set()
+
+    with scandir(dir_path) as entries:
+        if sffx is None:
+            uids = {entry.name for entry in entries if entry.is_dir()}
+        elif mtime_flag:
+            nchars = len(sffx)
+            uids = {entry.name[:-nchars]: entry.stat().st_mtime_ns for entry in entries
+                                                                if entry.name.endswith(sffx) and entry.is_file()}
+        else:
+            nchars = len(sffx)
+            uids = {entry.name[:-nchars] for entry in entries if entry.name.endswith(sffx) and entry.is_file()}
+
+    return uids
+
+def _is_wthr_dir(rcp_dir, coord):
+    """
+    True if there is a weather directory for the cell
+    """
+    wthr_uids = _invntry['dir_uids'].get(rcp_dir)
+    if wthr_uids is None:
+        return isdir(join(rcp_dir, coord))
+    else:
+        return coord in wthr_uids
+
 def read_lta_file(lta_csv):
     """
     assumes LTA file is validated via function _check_lta_file
+    reads from the LTA pack if the LTA directory has been packed - see lta_pack_fns.py
     """
-    df = read_csv(lta_csv, sep = ',')
-    lta = {}
-    lta['precip'] = df['mean_precip_mm'].to_list()
-    lta['tas'] = df['mean_Tair_degC'].to_list()
+    lta_pack = fetch_lta_pack(dirname(lta_csv))
+    if lta_pack is not None:
+        return lta_pack.read(basename(lta_csv)[:-4])
+
+    valid_flag, lta = _read_lta_file_cached(lta_csv)
 
     return lta
 
 def _check_lta_file(lta_csv):
     """
+    returns None if there is no LTA data for the cell otherwise False if the LTA file has NA values
+    consults the LTA pack, if present, rather than the file system
+    """
+    lta_pack = fetch_lta_pack(dirname(lta_csv))
+    if lta_pack is not None:
+        uid = basename(lta_csv)[:-4]
+        if uid in lta_pack:
+            return lta_pack.valid_flag(uid)
+        else:
+            return None
 
+    lta_rec = _read_lta_file_cached(lta_csv)
+    if lta_rec is None:
+        return None
+    else:
+        return lta_rec[0]
+
+def _read_lta_file_cached(lta_csv):
+    """
+    returns None if the LTA file does not exist otherwise validity flag and LTA dictionary
+    the modification time forms part of the cache key so that a changed file is read again
+    where the LTA directory is in the inventory the modification time recorded by the inventory is used
     """
-    valid_flag = True
-    with open(lta_csv, 'r') as fobj:
-        lines = [line.strip() for line in fobj]
+    lta_mtimes = _invntry['dir_uids'].get(dirname(lta_csv))
+    if lta_mtimes is not None:
+        mtime_ns = lta_mtimes.get(basename(lta_csv)[:-4])
+        if mtime_ns is None:
+            return None
+        else:
+            return _parse_lta_file(lta_csv, mtime_ns)
 
-    rec_list = lines[1].split(',')
-    if rec_list[-1] == 'NA':
-        valid_flag = False
+    try:
+        mtime_ns = stat(lta_csv).st_mtime_ns
+    except FileNotFoundError:
+        return None
 
-    return valid_flag
+    return _parse_lta_file(lta_csv, mtime_ns)
+
+@lru_cache(maxsize=LTA_CACHE_SIZE)
+def _parse_lta_file(lta_csv, mtime_ns):
+    """
+    single read of an LTA file which both validates and extracts the monthly values
+    """
+    valid_flag, vals, int_flags = parse_lta_csv(lta_csv)
+
+    return valid_flag, make_lta_dict(vals, int_flags)
+
+def _fetch_plnt_inpt(plnt_inpt_dir, coord):
+    """
+    returns None if there are no plant inputs for the cell
+    reads from the PI pack if the PI directory has been packed - see pi_pack_fns.py
+    """
+    pi_pack = fetch_pi_pack(plnt_inpt_dir)
+    if pi_pack is not None:
+        if coord in pi_pack:
+            return pi_pack.read(coord)
+        else:
+            return None
+
+    plnt_inpt_csv = join(plnt_inpt_dir, coord + '.csv')
+    pi_uids = _invntry['dir_uids'].get(plnt_inpt_dir)
+    if pi_uids is None:
+        pi_exists = isfile(plnt_inpt_csv)
+    else:
+        pi_exists = coord in pi_uids
+    if pi_exists:
+        return _read_plnt_inpt_csv_file(plnt_inpt_csv)
+    else:
+        return None
 
 def _read_plnt_inpt_csv_file(plnt_inpt_csv):
     """
@@ -215,32 +511,322 @@ def _read_plnt_inpt_csv_file(plnt_inpt_csv):
 
     return yrs_pi
 
-def _fetch_hwsd_data_from_rec(rec):
+class HwsdDrvrArrays(object, ):
     """
-     rec is a Series
+    driver columns required to generate cells extracted once from the driver dataframe into contiguous arrays
+    narrow types are used where values are unaffected: UIDs as fixed width bytes, integer coordinates as int32,
+    land use codes as int8 and soil values as float32 unless any value would not survive the round trip
     """
-    vals = rec.to_dict()
-    if 'ECOSSE_lu_code' in vals:
-        ecss_lu = vals['ECOSSE_lu_code']
+    ARRAY_ATTRS = ['uids', 'bng_x', 'bng_y', 'ecss_lus', 'soil', 'lons', 'lats']
+
+    def __init__(self, hwsd_drvr_data, soil_int_indxs=None):
+        """
+        hwsd_drvr_data is a dataframe, raises KeyError if a required column is absent
+        soil_int_indxs, if supplied, overrides the soil columns deemed to be integer e.g. for a chunk of a driver file
+        """
+        lu_metric = _fetch_lu_metric(hwsd_drvr_data)
+
+        uids = hwsd_drvr_data['UID'].to_numpy(dtype=str)
+        try:
+            self.uids = uids.astype(bytes_)
+        except UnicodeEncodeError:
+            self.uids = uids
+        del uids
+
+        self.bng_x = _narrow_int(hwsd_drvr_data['BNG_X'], int32)
+        self.bng_y = _narrow_int(hwsd_drvr_data['BNG_Y'], int32)
+        self.ecss_lus = _narrow_int(hwsd_drvr_data[lu_metric], int8)
+
+        soil = ascontiguousarray(hwsd_drvr_data[SOIL_METRICS].to_numpy(dtype=float64))  # shape (nrecs, 12)
+        uniq_vals = unique(soil)      # soil values are typically repeated many times
+        if array_equal(uniq_vals.astype(float32).astype(str).astype(float64), uniq_vals, equal_nan=True):
+            self.soil = soil.astype(float32)
+        else:
+            self.soil = soil
+        del soil, uniq_vals
+
+        # soil values from integer columns are written without a decimal point
+        # =====================================================================
+        if soil_int_indxs is None:
+            soil_int_indxs = [indx for indx, metric in enumerate(SOIL_METRICS)
+                                                                    if is_integer_dtype(hwsd_drvr_data[metric])]
+        self.set_scalars(soil_int_indxs)
+
+        # convert coordinates of all records in one call
+        # ==============================================
+        self.lons, self.lats = OSGB36toWGS84_arrays(self.bng_x, self.bng_y)
+
+    def set_scalars(self, soil_int_indxs):
+        """
+        attributes derived from the arrays - also used when the arrays are read from the driver cache
+        """
+        self.soil_int_indxs = soil_int_indxs
+        self.bytes_flag = self.uids.dtype.kind == 'S'
+        self.float32_flag = self.soil.dtype == float32
+        self.nrecs = len(self.uids)
+        self.grid = None    # built when first required - see _make_grid_index
+
+        return
+
+    def __len__(self):
+        return self.nrecs
+
+    def nbytes(self):
+        """
+        memory occupied by the arrays
+        """
+        return sum(arr.nbytes for arr in [self.uids, self.bng_x, self.bng_y, self.ecss_lus, self.soil, self.lons,
+                                                                                                        self.lats])
+
+    def _make_grid_index(self):
+        """
+        dense raster of 1 km grid cells holding the position of the record at each cell or -1 where there is none
+        only records whose UID is formed from their coordinates are indexed since UIDs are looked up by coordinates
+        """
+        start_time = time()
+        irows = ((self.bng_x % 1000 == 500) & (self.bng_y % 1000 == 500)).nonzero()[0]
+        bng_x = self.bng_x[irows].astype(int64)
+        bng_y = self.bng_y[irows].astype(int64)
+        coords = char.add(char.add(bng_x.astype(str), '_'), bng_y.astype(str))
+        if self.bytes_flag:
+            coords = coords.astype(bytes_)
+        match = coords == self.uids[irows]
+        nunmatched = len(irows) - int(match.sum())
+        irows, bng_x, bng_y = irows[match], bng_x[match], bng_y[match]
+        del coords, match
+
+        if len(irows) == 0:
+            east_min, nrth_min, ncols, nrows = 500, 500, 0, 0
+        else:
+            east_min, nrth_min = bng_x.min().item(), bng_y.min().item()
+            ncols = (bng_x.max().item() - east_min) // 1000 + 1
+            nrows = (bng_y.max().item() - nrth_min) // 1000 + 1
+
+        # where a UID is duplicated the last record is indexed
+        # ====================================================
+        raster = full((nrows, ncols), -1, dtype=int32 if self.nrecs <= iinfo(int32).max else int64)
+        maximum.at(raster, ((bng_y - nrth_min) // 1000, (bng_x - east_min) // 1000), irows)
+        self.grid = {'raster': raster, 'east_min': east_min, 'nrth_min': nrth_min}
+
+        if nunmatched > 0:
+            print(WARN_STR + '{} driver records are not indexed as their UID differs from their coordinates'
+                                                                                                .format(nunmatched))
+        print('Grid index of {} driver records over {} by {} km built in {:.1f} seconds'
+                                                    .format(len(irows), ncols, nrows, time() - start_time))
+        return
+
+    def fetch_bbox_irows(self, east_ll, east_ur, nrth_ll, nrth_ur):
+        """
+        return array of positions of records at grid cells from east_ll, nrth_ll up to but excluding east_ur, nrth_ur
+        ordered by northing then easting, all coordinates are of cell centres
+        """
+        if self.grid is None:
+            self._make_grid_index()
+
+        raster = self.grid['raster']
+        nrows, ncols = raster.shape
+        icol_ll = min(max(0, (east_ll - self.grid['east_min']) // 1000), ncols)
+        icol_ur = min(max(0, (east_ur - self.grid['east_min']) // 1000), ncols)
+        irow_ll = min(max(0, (nrth_ll - self.grid['nrth_min']) // 1000), nrows)
+        irow_ur = min(max(0, (nrth_ur - self.grid['nrth_min']) // 1000), nrows)
+
+        irows = raster[irow_ll:irow_ur, icol_ll:icol_ur].ravel()
+
+        return irows[irows >= 0]
+
+    def fetch_bbox_subset(self, east_ll, east_ur, nrth_ll, nrth_ur):
+        """
+        all records are already in memory - see HwsdDrvrStream.fetch_bbox_subset
+        """
+        return self, self.fetch_bbox_irows(east_ll, east_ur, nrth_ll, nrth_ur)
+
+    def fetch_extent(self):
+        """
+        minimum and maximum easting then minimum and maximum northing of the records
+        """
+        return [self.bng_x.min().item(), self.bng_x.max().item(), self.bng_y.min().item(), self.bng_y.max().item()]
+
+    def fetch_cell(self, irow):
+        """
+        return UID, longitude and latitude of a record
+        """
+        uid = self.uids[irow]
+
+        return uid.decode() if self.bytes_flag else str(uid), self.lons[irow].item(), self.lats[irow].item()
+
+    def fetch_hwsd_data(self, irow):
+        """
+        return land use code and list of soil values for a record
+        """
+        ecss_lu = self.ecss_lus[irow].item()
+        if self.float32_flag:
+            soil_rec = [float(val) for val in self.soil[irow].astype(str)]   # shortest representation of float32
+        else:
+            soil_rec = self.soil[irow].tolist()
+        for indx in self.soil_int_indxs:
+            soil_rec[indx] = int(soil_rec[indx])
+
+        return ecss_lu, soil_rec
+
+def _narrow_int(column, dtype):
+    """
+    return array of column values as dtype if the column is integer and its values fit otherwise unchanged
+    """
+    vals = column.to_numpy()
+    if is_integer_dtype(column) and len(vals) > 0:
+        info = iinfo(dtype)
+        if info.min <= vals.min() and vals.max() <= info.max:
+            return vals.astype(dtype)
+
+    return vals
+
+def _fetch_lu_metric(hwsd_drvr_data):
+    """
+    name of land use column, hwsd_drvr_data is a dataframe or list of column names
+    """
+    if 'ECOSSE_lu_code' in hwsd_drvr_data:
+        return 'ECOSSE_lu_code'
     else:
-        ecss_lu = vals['ECOSSE_land_use_code']
-
-    s_bulk = vals['S_BULK_DENSITY']
-    s_clay = vals['S_CLAY']
-    s_ph_h2o = vals['S_PH_H2O']
-    s_sand = vals['S_SAND']
-    s_silt = vals['S_SILT']
-    s_soc_kg_ha = vals['S_soc_kg_ha']
-    t_bulk = vals['T_BULK_DENSITY']
-    t_clay = vals['T_CLAY']
-    t_ph_h2o = vals['T_PH_H2O']
-    t_sand = vals['T_SAND']
-    t_silt = vals['T_SILT']
-    t_soc_kg_ha = vals['T_soc_kg_ha']
-
-    soil_rec = list([s_soc_kg_ha, s_bulk, s_ph_h2o, s_clay, s_sand, s_silt,
-                     t_soc_kg_ha, t_bulk, t_ph_h2o, t_clay, t_sand, t_silt])
-    return ecss_lu, soil_rec
+        return 'ECOSSE_land_use_code'
+
+class HwsdDrvrStream(object, ):
+    """
+    driver records read from the CSV file in chunks of chunk_size records when first required so that memory is
+    bounded by the chunk size rather than by the driver file; only columns required for generation are read
+    presents the same methods as HwsdDrvrArrays for records accessed by position, which should be in order
+    """
+    def __init__(self, hwsd_drvr_data_fn, chunk_size):
+        """
+        scan the driver file to count records, determine the extent and which columns are integer throughout
+        then record the byte offset of the first record of each chunk; raises KeyError if a column is absent
+        """
+        self.hwsd_drvr_data_fn = hwsd_drvr_data_fn
+        self.chunk_size = chunk_size
+        self.hdr = read_csv(hwsd_drvr_data_fn, nrows=0).columns.tolist()
+        lu_metric = _fetch_lu_metric(self.hdr)
+        self.metrics = ['UID', 'BNG_X', 'BNG_Y', lu_metric] + SOIL_METRICS
+        for metric in self.metrics:
+            if metric not in self.hdr:
+                raise KeyError(metric)
+
+        # chunks are read with the dtypes which the whole file would have
+        # ===============================================================
+        nrecs = 0
+        int_flags = dict.fromkeys(self.metrics[1:], True)
+        extent = [None, None, None, None]
+        for chunk in read_csv(hwsd_drvr_data_fn, usecols=self.metrics[1:], chunksize=chunk_size):
+            nrecs += len(chunk)
+            for metric in int_flags:
+                int_flags[metric] = int_flags[metric] and is_integer_dtype(chunk[metric])
+            for indx, metric in enumerate(['BNG_X', 'BNG_Y']):
+                extent[2*indx] = _min_or_max(min, extent[2*indx], chunk[metric].min())
+                extent[2*indx + 1] = _min_or_max(max, extent[2*indx + 1], chunk[metric].max())
+
+        for indx, metric in enumerate(['BNG_X', 'BNG_Y']):
+            if not int_flags[metric]:
+                extent[2*indx: 2*indx + 2] = [float(val) for val in extent[2*indx: 2*indx + 2]]
+
+        self.nrecs = nrecs
+        self.extent = extent
+        self.dtypes = {'UID': str}
+        self.dtypes.update({metric: float64 for metric in int_flags if not int_flags[metric]})
+        self.soil_int_indxs = [indx for indx, metric in enumerate(SOIL_METRICS) if int_flags[metric]]
+
+        # blank lines are ignored as they are by read_csv
+        # ===============================================
+        self.offsets = []
+        with open(hwsd_drvr_data_fn, 'rb') as fobj:
+            offset = len(fobj.readline())
+            irec = 0
+            for line in fobj:
+                if line.strip() != b'':
+                    if irec % chunk_size == 0:
+                        self.offsets.append(offset)
+                    irec += 1
+                offset += len(line)
+
+        self.ichunk = None
+        self.chunk = None
+
+    def __getstate__(self):
+        """
+        each process reads its own chunks
+        """
+        state = self.__dict__.copy()
+        state['ichunk'], state['chunk'] = None, None
+
+        return state
+
+    def __len__(self):
+        return self.nrecs
+
+    def _read_chunk(self, ichunk):
+        """
+        return dataframe of required columns for chunk ichunk
+        """
+        with open(self.hwsd_drvr_data_fn, 'rb') as fobj:
+            fobj.seek(self.offsets[ichunk])
+            chunk = read_csv(fobj, header=None, names=self.hdr, usecols=self.metrics, nrows=self.chunk_size,
+                                                                                                dtype=self.dtypes)
+        return chunk
+
+    def _fetch_chunk(self, irow):
+        """
+        return HwsdDrvrArrays for the chunk containing record irow and the position of the record in the chunk
+        """
+        ichunk = irow // self.chunk_size
+        if ichunk != self.ichunk:
+            self.chunk = None   # release previous chunk before reading the next
+            self.chunk = HwsdDrvrArrays(self._read_chunk(ichunk), self.soil_int_indxs)
+            self.ichunk = ichunk
+
+        return self.chunk, irow - ichunk * self.chunk_size
+
+    def fetch_extent(self):
+        """
+        extent determined when the driver file was scanned - see HwsdDrvrArrays.fetch_extent
+        """
+        return list(self.extent)
+
+    def fetch_bbox_subset(self, east_ll, east_ur, nrth_ll, nrth_ur):
+        """
+        return HwsdDrvrArrays comprising records within a bounding box and positions of the records at its grid cells
+        - see HwsdDrvrArrays.fetch_bbox_irows
+        """
+        subsets = []
+        for ichunk in range(len(self.offsets)):
+            chunk = self._read_chunk(ichunk)
+            bng_x, bng_y = chunk['BNG_X'], chunk['BNG_Y']
+            subsets.append(chunk[(bng_x >= east_ll) & (bng_x < east_ur) & (bng_y >= nrth_ll) & (bng_y < nrth_ur)])
+
+        drvr = HwsdDrvrArrays(concat(subsets, ignore_index=True), self.soil_int_indxs)
+
+        return drvr, drvr.fetch_bbox_irows(east_ll, east_ur, nrth_ll, nrth_ur)
+
+    def fetch_cell(self, irow):
+        """
+        C
+        """
+        chunk, irow_chunk = self._fetch_chunk(irow)
+
+        return chunk.fetch_cell(irow_chunk)
+
+    def fetch_hwsd_data(self, irow):
+        """
+        C
+        """
+        chunk, irow_chunk = self._fetch_chunk(irow)
+
+        return chunk.fetch_hwsd_data(irow_chunk)
+
+def _min_or_max(func, val_a, val_b):
+    """
+    apply func, min or max, ignoring an initial value of None
+    """
+    if val_a is None:
+        return val_b
+    else:
+        return func(val_a, val_b)
 
 class ClimGenNC(object,):
 
@@ -255,7 +841,7 @@ class ClimGenNC(object,):
 
         if wthr_rsrc != 'CHESS':
             print('weather resource ' + wthr_rsrc + ' not recognised in ' + func_name + ' - cannot continue')
-            QApplication.processEvents()
+            process_events()
             ret_code = False
 
         # determine user choices
@@ -269,17 +855,20 @@ class ClimGenNC(object,):
         # read a plant input file to get start and end years
         # ==================================================
         plnt_inpt_dir = form.w_pi_dir.text()
-        coord_dirs = listdir(plnt_inpt_dir)
-        coord_fn = coord_dirs[0]
-        plnt_inpt_csv = join(plnt_inpt_dir, coord_fn)
-        yrs_pi = _read_plnt_inpt_csv_file(plnt_inpt_csv)
+        pi_pack = fetch_pi_pack(plnt_inpt_dir)
+        if pi_pack is None:
+            coord_fn = [fn for fn in listdir(plnt_inpt_dir) if fn.endswith('.csv')][0]
+            plnt_inpt_csv = join(plnt_inpt_dir, coord_fn)
+            yrs_pi = _read_plnt_inpt_csv_file(plnt_inpt_csv)
+        else:
+            yrs_pi = {'yrs': pi_pack.yrs}
         sim_strt_yr = yrs_pi['yrs'][0] - 1  # first year is for existing land use
         sim_end_yr = yrs_pi['yrs'][-1]
 
         if sim_strt_yr < WTHR_STRT_YR:
             mess = 'simulation start year {} is before weather start year {}'.format(sim_strt_yr, WTHR_STRT_YR)
             print(WARN_STR + mess + ' cannot proceed')
-            QApplication.processEvents()
+            process_events()
             ret_code = False
 
         # TODO: needs tidying
@@ -322,3 +911,12 @@ class ClimGenNC(object,):
         self.sim_yrs = [yr for yr in range(sim_strt_yr, sim_end_yr + 1)]
 
         self.ret_code = ret_code
+
+    def __getstate__(self):
+        """
+        the progress widget cannot be pickled - required when passing this object to worker processes
+        """
+        state = self.__dict__.copy()
+        state['w_prgrss'] = None
+
+        return state
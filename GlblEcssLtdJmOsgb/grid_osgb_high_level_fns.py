@@ -12,22 +12,39 @@ __version__ = '0.0.1'
 __author__ = 's03mm5'
 
 from os.path import isdir, join, isfile
-from os import listdir, makedirs
-from PyQt5.QtWidgets import QApplication
+from os import makedirs, scandir, stat, replace, remove
+from headless_fns import process_events, BatchForm
 from time import time
-from glob import glob
-from shutil import move as move_file
-from shutil import copyfile, copytree, copy as copy_file
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from errno import EXDEV
+from shutil import copyfile, copy as copy_file
 
-from cvrtcoord import OSGB36toWGS84
 from grid_osgb_classes_and_fns import ClimGenNC, fetch_cell_ecss_data, fetch_ncells_aoi, fetch_dir_locations
+from grid_osgb_classes_and_fns import make_dir_inventory, install_dir_inventory, HwsdDrvrStream
 from make_ltd_data_files_osgb import MakeLtdDataFiles
-from prepare_ecss_files_from_cell import make_ecss_files_from_cell, update_progress
+from pi_pack_fns import fetch_pi_pack
+from prepare_ecss_files_from_cell import make_ecss_files_from_cell, update_progress, fetch_cell_writer, \
+                                                                            report_write_errors, fetch_cell_journal
+from prepare_ecss_files_from_cell import start_progress, fetch_metrics_fn, MAX_ERRORS_REPORTED
+from prepare_ecss_files_from_cell import make_shared_mdl_swtchs, rewrite_file, SPIN_MODE_LINE, SHARED_MDL_SWTCHS_FN, \
+                                                                                                SPIN_MDL_SWTCHS_FN
+from spin_archive_fns import fetch_spin_archive, is_spin_archive, SpinArchiveWriter
+from stage_timers import stage_timer, enable_stage_timers, fetch_stage_samples, merge_stage_samples, \
+                                                                                                report_stage_timers
 
 WARN_STR = '*** Warning *** '
 
 MASK_FLAG = False
 
+N_CELLS_CHUNK = 100     # number of driver records passed to a worker process in one task
+N_ADJUST_THREADS = 16   # threads used to adjust the Model_Switches.dat file of each cell
+N_HARVEST_THREADS = 16  # threads used to move the spinup file of each cell to the spinup path
+MDL_SWTCHS_FN = 'Model_Switches.dat'
+CNTR_KEYS = ['built_up', 'empty_lta', 'no_plnt_inpt', 'resumed']
+
+_wrkr = {}      # objects required by each worker process - see _init_worker
+
 def make_grid_cell_sims(form):
     """
     called from GUI
@@ -40,17 +57,18 @@ def make_grid_cell_sims(form):
 
     if form.hwsd_drvr_data is None:
         print(WARN_STR + 'No driver data - cannot proceed')
-        QApplication.processEvents()
+        process_events()
         return False
 
-    if len(glob(join(form.w_pi_dir.text(), '*.csv'))) == 0:
+    invntry = make_dir_inventory(lta_dir, rcp_dir, plnt_inpt_dir)
+    if fetch_pi_pack(plnt_inpt_dir) is None and len(invntry['dir_uids'][plnt_inpt_dir]) == 0:
         print(WARN_STR + 'No plant input files - cannot proceed')
-        QApplication.processEvents()
+        process_events()
         return False
 
     # ==================================
     print(' ')
-    QApplication.processEvents()
+    process_events()
 
     climgen = ClimGenNC(form, rcp_realis)   # Initialise the climate data object
     if not climgen.ret_code:
@@ -59,47 +77,193 @@ def make_grid_cell_sims(form):
 
     # main loop
     # =========
-    not_in_hwsd, built_up, empty_lta, no_plnt_inpt, ncells_vld, icells = 6*[0]
-    coord_list = []
+    cntrs = dict.fromkeys(CNTR_KEYS, 0)
+    not_in_hwsd = 0
+    drvr = form.hwsd_drvr_data
+    ngrid_cells = len(drvr)
+    dir_locs = (lta_dir, rcp_dir, plnt_inpt_dir)
+    journal = fetch_cell_journal(form, join(climgen.sims_dir, climgen.study))
+    make_shared_mdl_swtchs(form, join(climgen.sims_dir, climgen.study))
+    start_progress(fetch_metrics_fn(form, join(climgen.sims_dir, climgen.study)))
+    enable_stage_timers(form.sttngs['stage_timers_flag'])
+
+    n_workers = int(form.sttngs['n_workers'])
+    if n_workers > 1:
+        ncells_vld, errors = _make_cell_sims_parallel(form, climgen, ltd_data, dir_locs, drvr, cntrs,
+                                                            n_cells_max, ngrid_cells, n_workers, invntry, journal)
+    else:
+        writer = fetch_cell_writer(form)
+        ncells_vld, icells = 0, 0
+        last_time = time()
+        for irow in range(ngrid_cells):
+            icells += 1
+            last_time = update_progress(last_time, form.w_prgrss, ncells_vld, icells, ngrid_cells, n_cells_max)
+
+            if _make_cell_sims(form, climgen, ltd_data, dir_locs, drvr, irow, cntrs, writer, journal):
+                ncells_vld += 1
+                if ncells_vld >= n_cells_max:
+                    break
+
+        update_progress(last_time, form.w_prgrss, ncells_vld, icells, ngrid_cells, n_cells_max, final_flag=True)
+        errors = [] if writer is None else writer.close()
+    if journal is not None:
+        journal.merge()
+    report_stage_timers()
+
+    mess = 'Generated: {} grid cells\tRecords in driver file but not in HWSD file: {}\tBuilt up: {}\tEmpty lta files: {}'\
+                        .format(ncells_vld, not_in_hwsd, cntrs['built_up'], cntrs['empty_lta']) \
+                                                            + '\tNo plant inputs: {}'.format(cntrs['no_plnt_inpt'])
+    if form.sttngs['resume_flag']:
+        mess += '\tAlready generated: {}'.format(cntrs['resumed'])
+    print(mess)
+    process_events()
+
+    return report_write_errors(errors)
+
+def _make_cell_sims(form, climgen, ltd_data, dir_locs, drvr, irow, cntrs, writer=None, journal=None):
+    """
+    generate simulation files for the driver record at position irow, returns True if the cell is valid
+    writer, if not None, is a CellWriter to which writing of the files is passed
+    journal, if not None, is a CellJournal - cells it records as already written are counted but not rewritten
+    """
+    lta_dir, rcp_dir, plnt_inpt_dir = dir_locs
+    with stage_timer('cell_coords'):
+        coord, lon, lat = drvr.fetch_cell(irow)
+
+    lta_csv = join(lta_dir, coord + '.csv')
+    soil_rec, yrs_pi, wthr_dir = fetch_cell_ecss_data(ltd_data, lta_csv, rcp_dir, plnt_inpt_dir, coord,
+                                                                                            drvr, irow, cntrs)
+    if yrs_pi is None:
+        return False
+
+    if not make_ecss_files_from_cell(form, climgen, coord, lta_csv, wthr_dir, ltd_data, lat, lon, soil_rec,
+                                                                                                writer, journal):
+        cntrs['resumed'] += 1
+
+    return True
+
+def _make_cell_sims_parallel(form, climgen, ltd_data, dir_locs, drvr, cntrs, n_cells_max, ngrid_cells, n_workers,
+                                                                                                invntry, journal):
+    """
+    spread driver records across a pool of worker processes in chunks of N_CELLS_CHUNK records, each chunk being
+    a range of record positions - the driver arrays are passed to each worker once
+    a streamed driver is instead spread one driver chunk per task so that each driver chunk is read and parsed by
+    a single worker, only a chunk resubmitted as below is read again
+    each chunk is allotted a quota of valid cells so that no more than n_cells_max cells are generated; unscanned
+    records from a chunk which meets its quota are resubmitted so when n_cells_max binds the generated cells
+    may differ from those of a serial run but not their number
+    returns number of valid cells and list of write errors
+    """
+    wrkr_form = BatchForm()     # the GUI form cannot be passed to other processes
+    wrkr_form.sttngs = form.sttngs
+    wrkr_form.study = form.study
+
+    if isinstance(drvr, HwsdDrvrStream):
+        chunks = _chunk_cells(len(drvr), drvr.chunk_size)
+    else:
+        chunks = _chunk_cells(len(drvr))
+    resubmits = deque()
+    pending = {}
+    ncells_vld, icells, nrsrvd = 0, 0, 0
+    errors = []
     last_time = time()
-    ngrid_cells = len(form.hwsd_drvr_data)
+    print('Generating cells using {} worker processes'.format(n_workers))
+    process_events()
+
+    with ProcessPoolExecutor(n_workers, initializer=_init_worker,
+                        initargs=(wrkr_form, climgen, ltd_data, dir_locs, drvr, invntry, journal)) as executor:
+        while ncells_vld < n_cells_max:
+
+            # keep twice as many tasks as workers in hand
+            # ===========================================
+            while len(pending) < 2*n_workers:
+                quota = n_cells_max - ncells_vld - nrsrvd
+                if quota <= 0:
+                    break
+                if len(resubmits) > 0:
+                    chunk = resubmits.popleft()
+                else:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                quota = min(quota, len(chunk))
+                pending[executor.submit(_make_cell_sims_chunk, chunk, quota)] = (chunk, quota)
+                nrsrvd += quota
+
+            if len(pending) == 0:
+                break
 
-    for indx, rec in form.hwsd_drvr_data.iterrows():
-        icells += 1
-        last_time = update_progress(last_time, form.w_prgrss, ncells_vld, icells, ngrid_cells)
+            done, not_done = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk, quota = pending.pop(future)
+                nrsrvd -= quota
+                nvld, nscanned, chunk_cntrs, chunk_errors, samples = future.result()
+                errors += chunk_errors
+                merge_stage_samples(samples)
+                ncells_vld += nvld
+                icells += nscanned
+                for key in chunk_cntrs:
+                    cntrs[key] += chunk_cntrs[key]
 
-        eastng, nrthng = rec['BNG_X'], rec['BNG_Y']
-        coord = rec['UID']
+                if nscanned < len(chunk):
+                    resubmits.append(chunk[nscanned:])
 
-        lta_csv = join(lta_dir, coord + '.csv')
-        soil_rec, yrs_pi, wthr_dir = fetch_cell_ecss_data(ltd_data,
-                                lta_csv, rcp_dir, plnt_inpt_dir, coord, rec, empty_lta, built_up, no_plnt_inpt)
-        if yrs_pi is None:
-            continue
-        else:
-            coord_list.append(coord)
-            ncells_vld = len(coord_list)
-            lon, lat = OSGB36toWGS84(eastng, nrthng)
-            make_ecss_files_from_cell(form, climgen, coord, lta_csv, wthr_dir, ltd_data, lat, lon, soil_rec)
+            last_time = update_progress(last_time, form.w_prgrss, ncells_vld, icells, ngrid_cells, n_cells_max)
 
-            if ncells_vld >= n_cells_max:
+    update_progress(last_time, form.w_prgrss, ncells_vld, icells, ngrid_cells, n_cells_max, final_flag=True)
+
+    return ncells_vld, errors
+
+def _chunk_cells(nrecs, chunk_size=N_CELLS_CHUNK):
+    """
+    split record positions into ranges of up to chunk_size records
+    """
+    for strt_indx in range(0, nrecs, chunk_size):
+        yield range(strt_indx, min(strt_indx + chunk_size, nrecs))
+
+def _init_worker(form, climgen, ltd_data, dir_locs, drvr, invntry, journal):
+    """
+    runs once in each worker process
+    """
+    install_dir_inventory(invntry)
+    _wrkr['args'] = (form, climgen, ltd_data, dir_locs, drvr, journal)
+    _wrkr['writer'] = fetch_cell_writer(form)
+    enable_stage_timers(form.sttngs['stage_timers_flag'])
+
+    return
+
+def _make_cell_sims_chunk(chunk, quota):
+    """
+    runs in a worker process: generate up to quota valid cells from a chunk of driver records
+    any background writes are completed before returning so that their errors and stage timings are returned
+    with the chunk
+    """
+    form, climgen, ltd_data, dir_locs, drvr, journal = _wrkr['args']
+    writer = _wrkr['writer']
+    cntrs = dict.fromkeys(CNTR_KEYS, 0)
+    nvld, nscanned = 0, 0
+    for irow in chunk:
+        nscanned += 1
+        if _make_cell_sims(form, climgen, ltd_data, dir_locs, drvr, irow, cntrs, writer, journal):
+            nvld += 1
+            if nvld >= quota:
                 break
-        if ncells_vld >= n_cells_max:
-            break
 
-    print('Generated: {} grid cells\tRecords in driver file but not in HWSD file: {}\tBuilt up: {}\tEmpty lta files: {}'
-                                                .format(ncells_vld, not_in_hwsd, built_up, empty_lta))
-    QApplication.processEvents()
+    errors = [] if writer is None else writer.drain()
 
-    return True
+    return nvld, nscanned, cntrs, errors, fetch_stage_samples()
 
 def adjust_model_switches_files(form):
     """
-    move spinup files from grid cells to the spinup path
+    set the spin up mode in the Model_Switches.dat file of each cell of the study and, when reading spin up files,
+    copy the spinup file of each cell from the spinup path
+    the byte offset of the spin up mode is taken from the template so each file is patched by a single write
+    when the study has a shared Model_Switches file it is rewritten once and files linked to it are left alone
+    spinup files are extracted from the spinup archive if there is one - see spin_archive_fns.py
     """
+    start_time = time()
     study = form.w_study.text()
     study_dir = join(form.sttngs['sims_dir'], study)
-    dir_list = listdir(study_dir)
 
     if form.w_spin_save.isChecked():
         spin_mode = '2'
@@ -108,72 +272,268 @@ def adjust_model_switches_files(form):
     else:
         spin_mode = '0'
 
-    nadjust = 0
-    nspin = 0
-    for coord in dir_list:
-        sim_dir = join(study_dir, coord)
-        if isdir(sim_dir):
+    spin_dir = form.w_spin_dir.text() if spin_mode == '1' else None
+    spin_archive = None if spin_dir is None else fetch_spin_archive(spin_dir)
+    offset = _fetch_spin_mode_offset(form.sttngs.get('dflt_mdl_swtchs'))
+    shared_id = _set_shared_spin_mode(study_dir, spin_mode)
+
+    cntrs = {'changed': 0, 'unchanged': 0, 'failed': 0, 'shared': 0, 'spinup': 0}
+    errors = []
+    no_spinups = []
+    with ThreadPoolExecutor(max_workers=N_ADJUST_THREADS) as executor:
+        futures = {executor.submit(_adjust_cell_mdl_swtchs, entry.path, entry.name, spin_mode, offset, spin_dir,
+                shared_id, spin_archive): entry.path for entry in scandir(study_dir) if entry.is_dir()}
+        for future, sim_dir in futures.items():
+            try:
+                status, spin_status, err = future.result()
+            except (OSError, IndexError, ValueError) as exc:
+                status, spin_status, err = 'failed', None, 'could not adjust ' + sim_dir + ' - ' + str(exc)
+            if status is None:
+                continue
+            cntrs[status] += 1
+            if err is not None:
+                errors.append(err)
+            if spin_status is True:
+                cntrs['spinup'] += 1
+            elif spin_status is not None:
+                no_spinups.append(spin_status)
+
+    if spin_archive is not None:
+        spin_archive.close()
+
+    for err in errors[:MAX_ERRORS_REPORTED]:
+        print(WARN_STR + err)
+    for spin_ref_fn in no_spinups[:MAX_ERRORS_REPORTED]:
+        print(spin_ref_fn + ' does not exist')
+    if len(no_spinups) > MAX_ERRORS_REPORTED:
+        print('{} spinup files do not exist'.format(len(no_spinups)))
+
+    mess = 'Model Switches set to spin up mode {}: changed {}\tunchanged {}\tfailed {}\t'\
+                                        .format(spin_mode, cntrs['changed'], cntrs['unchanged'], cntrs['failed'])
+    if shared_id is not None:
+        mess += 'linked to shared file {}\t'.format(cntrs['shared'])
+    print(mess + 'copied {} spinup files in {:.1f} seconds'.format(cntrs['spinup'], time() - start_time))
+    process_events()
+
+    return
 
-            mdl_swtchs_fn = join(sim_dir,'Model_Switches.dat')
-            if isfile(mdl_swtchs_fn):
+def _fetch_spin_mode_offset(mdl_swtchs_fn):
+    """
+    byte offset of the spin up mode in a Model_Switches.dat file or None if it cannot be determined
+    """
+    if mdl_swtchs_fn is None or not isfile(mdl_swtchs_fn):
+        return None
 
-                with open(mdl_swtchs_fn, 'r') as finp:
-                    lines = finp.readlines()
+    with open(mdl_swtchs_fn, 'rb') as fmdl:
+        lines = fmdl.read().splitlines(keepends=True)
 
-                lines[15] = spin_mode + lines[15][1:]
-                with open(mdl_swtchs_fn, 'w') as finp:
-                    rc = finp.writelines(lines)
+    if len(lines) <= SPIN_MODE_LINE:
+        return None
 
-                nadjust += 1
+    return sum(len(line) for line in lines[:SPIN_MODE_LINE])
 
-                # copy spinup
-                # ===========
-                if spin_mode == '1':
-                    spin_dir = form.w_spin_dir.text()
-                    spin_ref_fn = join(spin_dir, 'spinup_' + coord + '.dat')
-                    if isfile(spin_ref_fn):
-                        spin_fn = join(sim_dir, 'spinup.dat')
-                        copy_file(spin_ref_fn, spin_fn)
-                        nspin += 1
-                    else:
-                        print(spin_ref_fn + ' does not exist')
-                        QApplication.processEvents()
+def _set_shared_spin_mode(study_dir, spin_mode):
+    """
+    rewrite the shared Model_Switches file of the study, if any, with the file for spin_mode written alongside it
+    by make_shared_mdl_swtchs and return the device and inode of the shared file otherwise return None
+    """
+    shared_mdl_swtchs = join(study_dir, SHARED_MDL_SWTCHS_FN)
+    spin_mdl_swtchs = join(study_dir, SPIN_MDL_SWTCHS_FN.format(spin_mode))
+    if not isfile(shared_mdl_swtchs) or not isfile(spin_mdl_swtchs):
+        return None
+
+    try:
+        with open(spin_mdl_swtchs, 'rb') as fobj:
+            rewrite_file(shared_mdl_swtchs, fobj.read())
+        shared_stat = stat(shared_mdl_swtchs)
+    except OSError as err:
+        print(WARN_STR + 'could not rewrite ' + shared_mdl_swtchs + ' - ' + str(err))
+        return None
+
+    return shared_stat.st_dev, shared_stat.st_ino
+
+def _adjust_cell_mdl_swtchs(sim_dir, coord, spin_mode, offset, spin_dir, shared_id=None, spin_archive=None):
+    """
+    runs in a thread: returns status, one of changed, unchanged, failed or shared or None if the cell has no
+    Model_Switches file, spin up status, True if the spinup file was copied, its path if it does not exist otherwise
+    None, and message if failed
+    the lines preceding offset are checked so that a file whose spin up line does not start at offset e.g. if
+    written from another template is instead rewritten in full
+    a file which is the shared file identified by shared_id, a device and inode, has already been set
+    """
+    mdl_swtchs_fn = join(sim_dir, MDL_SWTCHS_FN)
+    if not isfile(mdl_swtchs_fn):
+        return None, None, None
+
+    if shared_id is not None:
+        mdl_stat = stat(mdl_swtchs_fn)
+        if (mdl_stat.st_dev, mdl_stat.st_ino) == shared_id:
+            return 'shared', _copy_cell_spinup(sim_dir, coord, spin_dir, spin_archive), None
+
+    spin_byte = spin_mode.encode()
+    try:
+        with open(mdl_swtchs_fn, 'r+b') as fmdl:
+            head = b'' if offset is None else fmdl.read(offset + 1)
+            if offset is not None and len(head) == offset + 1 and head.count(b'\n') == SPIN_MODE_LINE \
+                                                                                    and head[-2:-1] == b'\n':
+                if head[-1:] == spin_byte:
+                    status = 'unchanged'
+                else:
+                    fmdl.seek(offset)
+                    fmdl.write(spin_byte)
+                    status = 'changed'
+            else:
+                fmdl.seek(0)
+                lines = fmdl.read().splitlines(keepends=True)
+                if lines[SPIN_MODE_LINE][:1] == spin_byte:
+                    status = 'unchanged'
+                else:
+                    lines[SPIN_MODE_LINE] = spin_byte + lines[SPIN_MODE_LINE][1:]
+                    fmdl.seek(0)
+                    fmdl.write(b''.join(lines))
+                    fmdl.truncate()
+                    status = 'changed'
+    except (OSError, IndexError) as err:
+        return 'failed', None, 'could not adjust ' + mdl_swtchs_fn + ' - ' + str(err)
 
-    print('Adjusted {} Model Switches and copied {} spinup files'.format(nadjust, nspin))
-    QApplication.processEvents()
+    return status, _copy_cell_spinup(sim_dir, coord, spin_dir, spin_archive), None
 
-    return
+def _copy_cell_spinup(sim_dir, coord, spin_dir, spin_archive=None):
+    """
+    copy the spinup file of the cell from spin_dir, if given: returns True if copied, its path if it does not exist
+    otherwise None
+    the spinup file is extracted from spin_archive, a SpinArchive, if it holds the cell
+    """
+    if spin_dir is None:
+        return None
+
+    if spin_archive is not None and coord in spin_archive:
+        spin_archive.extract(coord, join(sim_dir, 'spinup.dat'))
+        return True
+
+    spin_ref_fn = join(spin_dir, 'spinup_' + coord + '.dat')
+    if isfile(spin_ref_fn):
+        copy_file(spin_ref_fn, join(sim_dir, 'spinup.dat'))
+        return True
+    else:
+        return spin_ref_fn
 
 def move_spinup_files(form):
     """
     move spinup files from grid cells to the spinup path
+    cells are listed by a single scan of the study directory and their spinup files moved by a pool of threads,
+    each thread taking a batch of cells, so that the round trips to a file server overlap
+    when the study and spinup path share a filesystem each file is renamed otherwise it is copied then removed
+    if the spinup path has a spinup archive the files are instead appended to it - see spin_archive_fns.py
     """
+    start_time = time()
     study = form.w_study.text()
     study_dir = join(form.sttngs['sims_dir'], study)
-    dir_list = listdir(study_dir)
     spin_dir = form.w_spin_dir.text()
     if not isdir(spin_dir):
         makedirs(spin_dir)
         print('Created ' + spin_dir)
 
-    imove = 0
-    for dirn in dir_list:
-        dirn_full = join(study_dir, dirn)
-        if isdir(dirn_full):
-            spinup_fn = join(dirn_full, 'spinup.dat')
-            if isfile(spinup_fn):
-                spin_ref_fn = join(spin_dir, 'spinup_' + dirn + '.dat')
-                try:
-                    move_file(spinup_fn, spin_ref_fn)
-                except PermissionError as err:
-                    form.lgr.info(str(err))
-                else:
-                    imove += 1
-
-    print('Moved {} spinup files to {}'.format(imove, spin_dir))
-    QApplication.processEvents()
+    rename_flag = stat(study_dir).st_dev == stat(spin_dir).st_dev
+    writer = SpinArchiveWriter(spin_dir) if is_spin_archive(spin_dir) else None
+
+    cells = [(entry.path, entry.name) for entry in scandir(study_dir) if entry.is_dir()]
+    nbatches = 4 * N_HARVEST_THREADS
+    cntrs = {'moved': 0, 'copied': 0, 'archived': 0, 'failed': 0}
+    with ThreadPoolExecutor(max_workers=N_HARVEST_THREADS) as executor:
+        futures = [executor.submit(_move_spinup_batch, cells[ibatch::nbatches], spin_dir, rename_flag, writer)
+                                                                                    for ibatch in range(nbatches)]
+        for future in futures:
+            batch_cntrs, errors = future.result()
+            for key in batch_cntrs:
+                cntrs[key] += batch_cntrs[key]
+            for err in errors:
+                form.lgr.info(err)
+
+    if writer is not None:
+        writer.close()
+
+    mess = 'Moved {} spinup files to {} in {:.1f} seconds'\
+            .format(cntrs['moved'] + cntrs['copied'] + cntrs['archived'], spin_dir, time() - start_time)
+    if cntrs['archived'] > 0:
+        mess += '\tappended to spinup archive: {}'.format(cntrs['archived'])
+    if cntrs['copied'] > 0:
+        mess += '\tcopied across filesystems: {}'.format(cntrs['copied'])
+    if cntrs['failed'] > 0:
+        mess += '\tfailed: {} - see log file'.format(cntrs['failed'])
+    print(mess)
+    process_events()
 
     return
+
+def _move_spinup_batch(cells, spin_dir, rename_flag, writer=None):
+    """
+    runs in a thread: move the spinup files of a batch of cells, each a directory path and name
+    returns counts of files moved, copied, archived and failed and list of messages for those which failed
+    if writer is a SpinArchiveWriter spinup files are appended to the archive and removed once the archive has
+    been flushed
+    """
+    cntrs = {'moved': 0, 'copied': 0, 'archived': 0, 'failed': 0}
+    errors = []
+    if writer is not None:
+        archived = []
+        for sim_dir, coord in cells:
+            spinup_fn = join(sim_dir, 'spinup.dat')
+            try:
+                with open(spinup_fn, 'rb') as fspin:
+                    writer.append(coord, fspin.read())
+            except FileNotFoundError:
+                continue
+            except OSError as err:
+                cntrs['failed'] += 1
+                errors.append(str(err))
+                continue
+            archived.append(spinup_fn)
+
+        writer.flush()
+        for spinup_fn in archived:
+            try:
+                remove(spinup_fn)
+            except OSError as err:
+                errors.append(str(err))
+        cntrs['archived'] = len(archived)
+
+        return cntrs, errors
+
+    for sim_dir, coord in cells:
+        status, err = _move_cell_spinup(sim_dir, coord, spin_dir, rename_flag)
+        if status is not None:
+            cntrs[status] += 1
+        if err is not None:
+            errors.append(err)
+
+    return cntrs, errors
+
+def _move_cell_spinup(sim_dir, coord, spin_dir, rename_flag):
+    """
+    returns status, one of moved, copied or failed or None if the cell has no spinup file, and
+    message if failed
+    a rename which fails because the files are on different filesystems is followed by a copy
+    """
+    spinup_fn = join(sim_dir, 'spinup.dat')
+    spin_ref_fn = join(spin_dir, 'spinup_' + coord + '.dat')
+    try:
+        if rename_flag:
+            try:
+                replace(spinup_fn, spin_ref_fn)
+                return 'moved', None
+            except OSError as err:
+                if err.errno != EXDEV:
+                    raise
+
+        copyfile(spinup_fn, spin_ref_fn)
+        remove(spinup_fn)
+    except FileNotFoundError:
+        return None, None
+    except OSError as err:
+        return 'failed', str(err)
+
+    return 'copied', None
 def make_bbox_sims(form):
     """
     called from GUI
@@ -184,7 +544,8 @@ def make_bbox_sims(form):
 
     lta_dir, rcp_dir, rcp_realis, plnt_inpt_dir, n_cells_max = ret_code
 
-    ngrid_cells, nrth_ur, nrth_ll, east_ur, east_ll = fetch_ncells_aoi(form)
+    ngrid_cells, drvr, bbox_irows = fetch_ncells_aoi(form)
+    make_dir_inventory(lta_dir, rcp_dir, plnt_inpt_dir)
 
     # ==================================
     climgen = ClimGenNC(form, rcp_realis)  # Initialise the climate data object
@@ -194,44 +555,51 @@ def make_bbox_sims(form):
 
     # main loops
     # ==========
-    not_in_hwsd, built_up, empty_lta, no_plnt_inpt, ncells_vld, icells = 6 * [0]
+    cntrs = dict.fromkeys(CNTR_KEYS, 0)
+    ncells_vld, icells = 2 * [0]
     coord_list = []
-    last_time = time()
-    for nrthng in range(nrth_ll, nrth_ur, 1000):
-        for eastng in range(east_ll, east_ur, 1000):
-            icells += 1
-            last_time = update_progress(last_time, form.w_prgrss, ncells_vld, icells, ngrid_cells)
-
-            # coordinate must be present in the HWSD driver dataframe
-            # =======================================================
-            coord = str(eastng) + '_' + str(nrthng)
-            rec_df = form.hwsd_drvr_data.loc[form.hwsd_drvr_data['UID'] == coord]
-            if rec_df.shape[0] == 0:
-                not_in_hwsd += 1
-                continue
-
-            for indx, rec in rec_df.iterrows():     # returns a Series
-                pass
+    writer = fetch_cell_writer(form)
+    journal = fetch_cell_journal(form, join(climgen.sims_dir, climgen.study))
+    make_shared_mdl_swtchs(form, join(climgen.sims_dir, climgen.study))
+
+    # only grid cells present in the HWSD driver are visited - see fetch_ncells_aoi
+    # ==============================================================================
+    not_in_hwsd = ngrid_cells - len(bbox_irows)
+    nbbox_cells = len(bbox_irows)
+    last_time = start_progress(fetch_metrics_fn(form, join(climgen.sims_dir, climgen.study)))
+    enable_stage_timers(form.sttngs['stage_timers_flag'])
+    for irow in bbox_irows.tolist():
+        icells += 1
+        last_time = update_progress(last_time, form.w_prgrss, ncells_vld, icells, nbbox_cells, n_cells_max)
 
-            lta_csv = join(lta_dir, coord + '.csv')
-            soil_rec, yrs_pi, wthr_dir = fetch_cell_ecss_data(ltd_data,
-                                    lta_csv, rcp_dir, plnt_inpt_dir, coord, rec, empty_lta, built_up, no_plnt_inpt)
-            if yrs_pi is None:
-                continue
-            else:
-                coord_list.append(coord)
-                ncells_vld = len(coord_list)
-                if ncells_vld >= n_cells_max:
-                    break
+        with stage_timer('cell_coords'):
+            coord, lon, lat = drvr.fetch_cell(irow)
+        lta_csv = join(lta_dir, coord + '.csv')
+        soil_rec, yrs_pi, wthr_dir = fetch_cell_ecss_data(ltd_data,
+                                                    lta_csv, rcp_dir, plnt_inpt_dir, coord, drvr, irow, cntrs)
+        if yrs_pi is None:
+            continue
+        else:
+            coord_list.append(coord)
+            ncells_vld = len(coord_list)
+            if ncells_vld >= n_cells_max:
+                break
 
-                lon, lat = OSGB36toWGS84(eastng, nrthng)
-                make_ecss_files_from_cell(form, climgen, coord, lta_csv, wthr_dir, ltd_data, lat, lon, soil_rec)
+            if not make_ecss_files_from_cell(form, climgen, coord, lta_csv, wthr_dir, ltd_data, lat, lon,
+                                                                                soil_rec, writer, journal):
+                cntrs['resumed'] += 1
 
-        if ncells_vld >= n_cells_max:
-            break
+    update_progress(last_time, form.w_prgrss, ncells_vld, icells, nbbox_cells, n_cells_max, final_flag=True)
+    errors = [] if writer is None else writer.close()
+    if journal is not None:
+        journal.merge()
+    report_stage_timers()
 
-    print('Found: {} valid coords\tNot in HWSD file: {}\tBuilt up: {}\tEmpty lta files: {}'
-                                                .format(ncells_vld, not_in_hwsd, built_up, empty_lta))
-    QApplication.processEvents()
+    mess = 'Found: {} valid coords\tNot in HWSD file: {}\tBuilt up: {}\tEmpty lta files: {}'\
+                                    .format(ncells_vld, not_in_hwsd, cntrs['built_up'], cntrs['empty_lta'])
+    if form.sttngs['resume_flag']:
+        mess += '\tAlready generated: {}'.format(cntrs['resumed'])
+    print(mess)
+    process_events()
 
-    return True
+    return report_write_errors(errors)
@@ -0,0 +1,96 @@
+#-------------------------------------------------------------------------------
+# Name:        headless_fns.py
+# Purpose:     enable the generation functions to be run without PyQt
+# Author:      Mike Martin
+# Created:     18/10/2026
+# Licence:     <your licence>
+# Description: the generation functions read their settings from widgets attached to a form object; a BatchForm
+#              supplies plain stand-ins for those widgets so that no Qt modules are imported in batch mode
+#-------------------------------------------------------------------------------
+#
+__prog__ = 'headless_fns.py'
+__version__ = '0.0.1'
+__author__ = 's03mm5'
+
+from sys import modules
+from threading import current_thread, main_thread
+
+def process_events():
+    """
+    flush pending GUI events when running under the PyQt GUI, otherwise do nothing
+    PyQt is only consulted if it has already been imported i.e. by the GUI and only from the main thread
+    """
+    qt_widgets = modules.get('PyQt5.QtWidgets')
+    if qt_widgets is not None and current_thread() is main_thread():
+        qt_widgets.QApplication.processEvents()
+
+    return
+
+class BatchWidget(object, ):
+    """
+    minimal stand-in for the QLineEdit, QLabel, QComboBox, QCheckBox and QRadioButton methods used by the generation
+    functions
+    """
+    def __init__(self, text='', checked=False, echo=False):
+        """
+        if echo is set then text assigned to the widget is printed e.g. for progress reporting
+        """
+        self._text = text
+        self._checked = checked
+        self._enabled = True
+        self.echo = echo
+
+    def text(self):
+        return self._text
+
+    def setText(self, text):
+        self._text = text
+        if self.echo:
+            print(text)
+
+    def currentText(self):
+        return self._text
+
+    def setCurrentText(self, text):
+        self._text = text
+
+    def isChecked(self):
+        return self._checked
+
+    def setChecked(self, checked):
+        self._checked = checked
+
+    def isEnabled(self):
+        return self._enabled
+
+    def setEnabled(self, enabled):
+        self._enabled = enabled
+
+class BatchForm(object, ):
+    """
+    stand-in for the Form class in GlblEcsseHwsdGUI.py - any w_ attribute not explicitly set is created on first use
+    """
+    def __init__(self):
+        """
+        mirror the non-widget attributes set by the GUI
+        """
+        self.version = 'NetZeroPlus'
+        self.depths = list([30, 100])  # soil depths - see commonSection
+        self.hwsd_drvr_data = None
+        self.study = ''
+
+        self.w_prgrss = BatchWidget(echo=True)
+        self.w_spin_off = BatchWidget(checked=True)     # default setting
+        self.w_spin_read = BatchWidget()
+        self.w_spin_save = BatchWidget()
+
+    def __getattr__(self, name):
+        """
+        only invoked when normal attribute lookup fails
+        """
+        if name.startswith('w_'):
+            widget = BatchWidget()
+            setattr(self, name, widget)
+            return widget
+
+        raise AttributeError(name)
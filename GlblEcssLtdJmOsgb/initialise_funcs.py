@@ -23,12 +23,14 @@ from json.decoder import JSONDecodeError
 from time import sleep
 import sys
 
-from PyQt5.QtWidgets import QApplication
+from headless_fns import process_events
 
 from glbl_ecss_cmmn_funcs import (build_and_display_studies, check_sims_dir, check_runsites, fetch_notepad_path)
 from set_up_logging import set_up_logging
 
 from grid_osgb_classes_and_fns import make_hwsd_drvr_df, report_pi_csvs, report_spin_dir
+from prepare_ecss_files_from_cell import WTHR_LINK_MODES
+from ecosse_scheduler import ECOSSE_LAUNCH_MODES
 
 WARN_STR = '*** Warning *** '
 ERROR_STR = '*** Error *** '
@@ -44,6 +46,22 @@ MNDTRY_GRPS_CONFIG = ['cmnGUI', 'minGUI']
 MIN_GUI_LIST = ['wthrRsrce', 'bbox', 'use_drvr_flag']
 CMN_GUI_LIST = ['study', 'climScnr', 'realis', 'eqilMode', 'n_coords', 'pi_data_dir', 'spinup_dir']
 
+# optional settings in group glbl_ecss_sttngs with their defaults
+# ===============================================================
+OPTNL_STTNGS = {'n_workers': 1,     # number of processes used to generate cells
+                'wthr_link_mode': 'copy',   # how weather files are placed in the sims tree, see WTHR_LINK_MODES
+                'n_writers': 0,     # number of threads writing cell files in the background, 0 for none
+                'journal_flag': False,  # journal the cells generated so that a later run can resume
+                'resume_flag': False,   # skip cells recorded in the journal of a previous run, see CellJournal
+                'drvr_chunk_size': 0,   # if positive the driver file is streamed in chunks of this many records
+                'drvr_cache_flag': True,    # keep a binary cache of the parsed driver file alongside it
+                'n_ecosse_workers': 0,  # number of concurrent ECOSSE processes, 0 for one per core
+                'ecosse_timeout': 3600,     # seconds after which an ECOSSE run of a cell is killed, 0 for no limit
+                'ecosse_launch_mode': 'scheduler',  # how ECOSSE is run over a study, see ECOSSE_LAUNCH_MODES
+                'metrics_flag': False,  # write progress reports to the study as JSON lines, see update_progress
+                'stage_timers_flag': False,     # time each stage of cell generation, see stage_timers.py
+                'shared_mdl_swtchs_flag': False}    # link each cell to one Model_Switches file per study
+
 # ==============================================================
 
 def initiation(form):
@@ -101,6 +119,51 @@ def initiation(form):
     form.sttngs = sttngs
     return
 
+def initiation_batch(form, setup_file, config_file, ovrrds=None):
+    """
+    counterpart of initiation for batch mode: process the setup file then apply the study configuration file
+    to the stand-in widgets of form, a BatchForm
+    ovrrds is a dictionary of settings which take precedence over those of the setup file
+    """
+    form.sttngs = _read_setup_file(form, setup_file)
+    sttngs = form.sttngs
+    if ovrrds is not None:
+        sttngs.update(ovrrds)
+        _check_optnl_sttngs(sttngs)
+
+    dflt_mdl_swtchs = join(sttngs['ecss_fns_dir'], MODEL_SWITCHES_FN)
+    if isfile(dflt_mdl_swtchs):
+        sttngs['dflt_mdl_swtchs'] = dflt_mdl_swtchs
+    else:
+        print(ERROR_STR + '{} file does not exist in directory {}'.format(MODEL_SWITCHES_FN, sttngs['ecss_fns_dir']))
+        return False
+
+    if not check_sims_dir(form.lgr, sttngs['sims_dir']):
+        return False
+
+    if not isfile(config_file):
+        print(ERROR_STR + 'configuration file ' + config_file + ' must exist')
+        return False
+
+    sttngs['config_fn'] = config_file
+
+    return read_config_file(form)
+
+def _check_optnl_sttngs(sttngs):
+    """
+    replace optional settings whose values are not recognised - applied to the setup file and to any overrides
+    """
+    if sttngs['wthr_link_mode'] not in WTHR_LINK_MODES:
+        print(WARN_STR + 'weather link mode ' + str(sttngs['wthr_link_mode']) + ' must be one of '
+                                                        + ', '.join(WTHR_LINK_MODES) + ' - will copy weather files')
+        sttngs['wthr_link_mode'] = 'copy'
+    if sttngs['ecosse_launch_mode'] not in ECOSSE_LAUNCH_MODES:
+        print(WARN_STR + 'ECOSSE launch mode ' + str(sttngs['ecosse_launch_mode']) + ' must be one of '
+                                                        + ', '.join(ECOSSE_LAUNCH_MODES) + ' - will use the scheduler')
+        sttngs['ecosse_launch_mode'] = 'scheduler'
+
+    return
+
 def _read_setup_file(form, fname_setup):
     """
     read settings used for programme from the setup file, if it exists,
@@ -168,6 +231,10 @@ def _read_setup_file(form, fname_setup):
     settings[grp]['run_ecosse_flag'] = sttngs_tmp['run_ecosse_flag']
     settings[grp]['runsites_cnfg_fn'] = runsites_cnfg_fn
     settings[grp]['zeros_file'] = False   # legacy
+    for key in OPTNL_STTNGS:
+        if key not in settings[grp]:
+            settings[grp][key] = OPTNL_STTNGS[key]
+    _check_optnl_sttngs(settings[grp])
     settings[grp]['wthr_rsrc'] = 'CHESS'
     settings[grp]['req_resol_upscale'] = 1
     settings[grp]['stdout_path'] = join(sims_dir, 'stdout.txt')     # location of job output from run sites script
@@ -387,7 +454,7 @@ def write_runsites_cnfg_fn(form):
             print(ERROR_STR + 'writing json file ' + runsites_cnfg_fn + str(err))
 
         print('Edited ' + runsites_cnfg_fn + '\n\twith simulation location: ' + sims_dir)
-        QApplication.processEvents()
+        process_events()
 
     return True
 
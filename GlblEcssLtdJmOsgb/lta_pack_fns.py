@@ -0,0 +1,239 @@
+#-------------------------------------------------------------------------------
+# Name:        lta_pack_fns.py
+# Purpose:     consolidate a directory of long term average (LTA) climate CSV files into a single binary store
+# Author:      Mike Martin
+# Created:     18/10/2026
+# Licence:     <your licence>
+# Description: usage: python lta_pack_fns.py lta_dir [lta_dir ...]
+#              writes lta_pack.npy, a memory-mappable float64 array of shape (ncells, 24) comprising 12 monthly
+#              precipitation values followed by 12 monthly temperatures with NA stored as NaN, and
+#              lta_pack_index.npz comprising the UIDs, validity mask, integer flags and the number and newest
+#              modification time of the CSV files when packed
+#              a pack is ignored, and the CSV files read instead, if the CSV files have changed since it was written
+#              the pack must then be rebuilt
+#-------------------------------------------------------------------------------
+#
+__prog__ = 'lta_pack_fns.py'
+__version__ = '0.0.1'
+__author__ = 's03mm5'
+
+import sys
+from os import scandir
+from os.path import join, isfile
+from csv import reader
+from time import time
+
+from numpy import array, empty, float64, nan, load as np_load, save as np_save, savez as np_savez
+
+LTA_PACK_FN = 'lta_pack.npy'
+LTA_INDX_FN = 'lta_pack_index.npz'
+LTA_METRICS = ['mean_precip_mm', 'mean_Tair_degC']
+NMNTHS = 12
+
+WARN_STR = '*** Warning *** '
+
+_lta_packs = {}     # packs keyed by LTA directory, None where there is no pack - see fetch_lta_pack
+
+class LtaPack(object, ):
+    """
+    read only access to a packed LTA directory
+    """
+    def __init__(self, lta_dir):
+        """
+        the data array is memory mapped so only rows which are read are loaded
+        """
+        self.lta_dir = lta_dir
+        self.data = np_load(join(lta_dir, LTA_PACK_FN), mmap_mode='r')
+
+        indx = np_load(join(lta_dir, LTA_INDX_FN))
+        self.vld = indx['vld']
+        self.int_flags = indx['int_flags']
+        self.uid_indx = {uid: irow for irow, uid in enumerate(indx['uids'].tolist())}
+        self.stamp = read_pack_stamp(indx)
+
+    def __contains__(self, uid):
+        return uid in self.uid_indx
+
+    def valid_flag(self, uid):
+        """
+        counterpart of _check_lta_file: False if the temperature of the first month is NA
+        """
+        return bool(self.vld[self.uid_indx[uid]])
+
+    def read(self, uid):
+        """
+        counterpart of read_lta_file
+        """
+        irow = self.uid_indx[uid]
+
+        return make_lta_dict(self.data[irow].tolist(), self.int_flags[irow].tolist())
+
+def fetch_lta_pack(lta_dir):
+    """
+    return LtaPack for lta_dir or None if the directory has not been packed or the pack is out of date
+    result is retained for the run
+    """
+    if lta_dir not in _lta_packs:
+        if isfile(join(lta_dir, LTA_PACK_FN)) and isfile(join(lta_dir, LTA_INDX_FN)):
+            lta_pack = LtaPack(lta_dir)
+            if not check_pack_stamp(lta_dir, lta_pack.uid_indx, lta_pack.stamp, 'LTA', __prog__):
+                lta_pack = None
+            _lta_packs[lta_dir] = lta_pack
+        else:
+            _lta_packs[lta_dir] = None
+
+    return _lta_packs[lta_dir]
+
+def install_lta_pack(lta_dir, pack_flag):
+    """
+    accept the outcome of fetch_lta_pack in another process, pack_flag being True if a valid pack was found,
+    so that the directory is not scanned again e.g. by each worker process
+    """
+    if lta_dir not in _lta_packs:
+        _lta_packs[lta_dir] = LtaPack(lta_dir) if pack_flag else None
+
+    return
+
+def scan_csv_dir(dir_path):
+    """
+    return set of UIDs of the CSV files in dir_path and the modification time of the most recently modified
+    """
+    uids = set()
+    mtime_ns = 0
+    with scandir(dir_path) as entries:
+        for entry in entries:
+            if entry.name.endswith('.csv') and entry.is_file():
+                uids.add(entry.name[:-4])
+                mtime_ns = max(mtime_ns, entry.stat().st_mtime_ns)
+
+    return uids, mtime_ns
+
+def read_pack_stamp(indx):
+    """
+    number and newest modification time of the CSV files when packed or None for a pack written without them
+    """
+    if 'ncsvs' in indx.files and 'mtime_ns' in indx.files:
+        return int(indx['ncsvs']), int(indx['mtime_ns'])
+    else:
+        return None
+
+def check_pack_stamp(dir_path, uid_indx, stamp, descr, pack_prog):
+    """
+    return False if the number or newest modification time of the CSV files in dir_path differ from those
+    recorded in the pack - if the CSV files have been removed since packing the pack is used as is
+    CSV files which are not in the pack are counted and reported
+    """
+    csv_uids, mtime_ns = scan_csv_dir(dir_path)
+    if len(csv_uids) == 0:
+        return True
+
+    if stamp != (len(csv_uids), mtime_ns):
+        mess = descr + ' pack in ' + dir_path + ' is out of date, CSV files have been added, removed or modified'
+        print(WARN_STR + mess + ' since packing - pack ignored, rerun ' + pack_prog + ' to rebuild it')
+        return False
+
+    nmissing = len(csv_uids - uid_indx.keys())
+    if nmissing > 0:
+        print(WARN_STR + '{} {} CSV files in {} are not in the pack, these cells will be treated as having no data'
+                                                                                .format(nmissing, descr, dir_path))
+    return True
+
+def pack_lta_dir(lta_dir):
+    """
+    read every <UID>.csv file in lta_dir and write the pack and index files to lta_dir
+    """
+    start_time = time()
+    csv_uids, mtime_ns = scan_csv_dir(lta_dir)
+    lta_csvs = sorted(uid + '.csv' for uid in csv_uids)
+    ncells = len(lta_csvs)
+    print('Packing {} LTA files from {}'.format(ncells, lta_dir))
+
+    data = empty((ncells, 2*NMNTHS), dtype=float64)
+    vld = empty(ncells, dtype=bool)
+    int_flags = empty((ncells, 2), dtype=bool)
+    uids = []
+    nbad = 0
+    for irow, lta_csv in enumerate(lta_csvs):
+        uids.append(lta_csv[:-4])
+        try:
+            vld[irow], data[irow], int_flags[irow] = parse_lta_csv(join(lta_dir, lta_csv))
+        except (ValueError, IndexError, KeyError) as err:
+            print(WARN_STR + 'could not parse ' + lta_csv + ' - ' + str(err) + ' - cell will be treated as empty')
+            vld[irow], data[irow], int_flags[irow] = False, nan, False
+            nbad += 1
+
+    np_save(join(lta_dir, LTA_PACK_FN), data)
+    np_savez(join(lta_dir, LTA_INDX_FN), uids=array(uids, dtype=str), vld=vld, int_flags=int_flags,
+                                                                            ncsvs=ncells, mtime_ns=mtime_ns)
+    _lta_packs.pop(lta_dir, None)
+
+    print('Packed {} LTA files of which {} are valid and {} could not be parsed in {:.1f} seconds'
+                                                .format(ncells, int(vld.sum()), nbad, time() - start_time))
+    return
+
+def parse_lta_csv(lta_csv):
+    """
+    read an LTA file in a single pass
+    return validity flag, the 24 values with NA as NaN and a flag for each metric which is True when all its
+    values are integers - in which case pandas would have returned integers
+    """
+    with open(lta_csv, 'r', newline='') as fobj:
+        recs = list(reader(fobj))
+
+    hdr = [metric.strip() for metric in recs[0]]
+    vld_flag = recs[1][-1].strip() != 'NA'
+
+    vals = []
+    int_flags = []
+    for metric in LTA_METRICS:
+        icol = hdr.index(metric)
+        strs = [rec[icol].strip() for rec in recs[1:NMNTHS + 1]]
+        if len(strs) != NMNTHS:
+            raise ValueError('expected {} monthly records'.format(NMNTHS))
+        int_flags.append(all(is_int_str(val) for val in strs))
+        vals += [nan if val == 'NA' else float(val) for val in strs]
+
+    return vld_flag, vals, int_flags
+
+def is_int_str(val):
+    """
+    True if val would be parsed as an integer
+    """
+    try:
+        int(val)
+    except ValueError:
+        return False
+
+    return True
+
+def make_lta_dict(vals, int_flags):
+    """
+    arrange the 24 values as returned by read_lta_file, values of an integer metric are stored as floats
+    """
+    precip = vals[:NMNTHS]
+    tas = vals[NMNTHS:]
+
+    lta = {}
+    lta['precip'] = [int(val) for val in precip] if int_flags[0] else precip
+    lta['tas'] = [int(val) for val in tas] if int_flags[1] else tas
+
+    return lta
+
+def main(argv=None):
+    """
+    pack each LTA directory given on the command line
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if len(argv) == 0:
+        print('usage: python ' + __prog__ + ' lta_dir [lta_dir ...]')
+        return 1
+
+    for lta_dir in argv:
+        pack_lta_dir(lta_dir)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -90,6 +90,8 @@ class MakeLtdDataFiles(object):
         self.landUses = None
         self.plantInput = None
 
+        self._tmplts = {}    # input.txt templates keyed by number of soil layers and years - see _fetch_template
+
 # ========================= end of init =================================================
     def add_lus_and_pis(self, lu_type, yrs_pi):
         """
@@ -125,6 +127,79 @@ class MakeLtdDataFiles(object):
         spacer = ' ' * spacer_len
         return '{0}{1}# {2}\n'.format(data, spacer, comment)
 
+    def sffx(self, comment):
+        """
+        part of a line following the data - padding for the data is added by pad
+        """
+        return '# {0}\n'.format(comment)
+
+    def pad(self, data):
+        """
+        data followed by the same spacing as in method line
+        """
+        return (data + '  ').ljust(self.spacer_len)
+
+    def _fetch_template(self, num_lyrs, lyr_depths, num_yrs):
+        """
+        compile those parts of input.txt which are the same for every cell of the study once for each combination
+        of number of soil layers and number of years, per cell values are then added by method write
+        """
+        tmplt_key = (num_lyrs, num_yrs)
+        if tmplt_key in self._tmplts:
+            return self._tmplts[tmplt_key]
+
+        # Soil parameters
+        # ===============
+        head = [self.line('{0}'.format(self.equil_mode), 'Mode of equilibrium run')]
+        head.append(self.line('{0}'.format(num_lyrs), 'Number of soil layers (max 10)'))
+        for lyr_num, lyr_depth in enumerate(lyr_depths):
+            head.append(self.line('{0}'.format(lyr_depth), 'Depth of bottom of SOM layer {0} [cm]'.format(lyr_num+1)))
+
+        # for each LUT the position in the soil list and comment for each soil characteristic of each layer
+        # =================================================================================================
+        soil_descrs = ['C content [kgC/ha]', 'Bulk density [g/cm3]', 'pH', '% clay by weight', '% silt by weight',
+                                                                                                '% sand by weight']
+        soil_slots = []
+        for key in self._luts:
+            for lyr_num in range(num_lyrs):
+                strt_indx = 6*lyr_num
+                for indx, descr in enumerate(soil_descrs):
+                    comment = '{0} for this soil under {1} in SOM layer {2}'.format(descr, key, lyr_num+1)
+                    soil_slots.append((strt_indx + indx, self.sffx(comment)))
+
+        # Long term average plant C input
+        # ===============================
+        lt_plnt_inpts = []
+        for key in self._luts:
+            lt_plnt_inpts.append(self.line('{}'.format(self.plant_inputs[key]),
+                        '{} long term average plant C input [kgC/ha/yr] (obsolete - use a dummy value)'.format(key)))
+
+        # Other parameters
+        # ================
+        othr_prms = [self.line('{0}'.format(self.wt_at_strt), 'Water table depth at strt [cm]')]
+        if self.wt_max_stand >= 0:  # ensures backward compatibility
+            othr_prms.append(self.line('{0}'.format(self.wt_max_stand), 'Max standing water [cm]'))
+        othr_prms.append(self.line('{0}'.format(self.drain_class), 'Drainage class (not yet used)'))
+        othr_prms.append(self.line('{0}'.format(self.c_accum_b4_change), 'C accumulated before change [kgC/ha/yr] (obsolete - use a dummy value)'))
+        othr_prms.append(self.line('{0}'.format(self.ch4_b4_change), 'CH4 emission before change [kgC/ha/yr] (not used yet)'))
+        othr_prms.append(self.line('{0}'.format(self.co2_b4_change), 'CO2 emission before change [kgC/ha/yr] (not used yet)'))
+        othr_prms.append(self.line('{0}'.format(self.doc_loss_b4_change), 'DOC loss before change [kgC/ha/yr] (not used yet)'))
+        othr_prms.append(self.line('{0}'.format(self.num_grow_seasons), 'Number of growing seasons to simulate'))
+
+        # Future land use and plant inputs then climate file names
+        # ========================================================
+        pi_sffxs = [self.sffx('Year {} land use code and plant C input [kgC/ha/yr]'.format(year_num))
+                                                                                    for year_num in range(num_yrs)]
+        met_slots = [(fname, self.sffx('Year {0} climate file'.format(year_num+1)))
+                                                                for year_num, fname in enumerate(self.met_fnames)]
+
+        tmplt = {'head': ''.join(head), 'soil_slots': soil_slots, 'lt_plnt_inpts': ''.join(lt_plnt_inpts),
+                 'lat_sffx': self.sffx('Latitude [decimal deg]'), 'othr_prms': ''.join(othr_prms),
+                 'pi_sffxs': pi_sffxs, 'met_slots': met_slots}
+        self._tmplts[tmplt_key] = tmplt
+
+        return tmplt
+
     def validate(self):
         """
         Misc
@@ -168,8 +243,21 @@ class MakeLtdDataFiles(object):
         return
 
     def write(self, sim_dir, soil, latitude, hist_weather_recs, met_rel_path, input_fname='input.txt'):
+        """
+        create the lines of the input file then write them
+        """
+        output_buff = self.make_lines(sim_dir, soil, latitude, hist_weather_recs, met_rel_path, input_fname)
+        if output_buff is None:
+            return
+
+        self.write_lines(sim_dir, output_buff, input_fname)
+
+        return
+
+    def make_lines(self, sim_dir, soil, latitude, hist_weather_recs, met_rel_path, input_fname='input.txt'):
         """
         MJM: this function has been hacked around from mksims original
+        returns lines of the input file or None if they cannot be created
 
         previously:
             # Read the file comprising historic precipitation and temperature
@@ -195,67 +283,46 @@ class MakeLtdDataFiles(object):
             num_lyrs = self.num_lyrs
             lyr_depths = self.lyr_depths
 
-        # Soil parameters
-        # ===============
-        output_buff = []
-        output_buff.append(self.line('{0}'.format(self.equil_mode), 'Mode of equilibrium run'))
-        output_buff.append(self.line('{0}'.format(num_lyrs), 'Number of soil layers (max 10)'))
-        for lyr_num, lyr_depth in enumerate(lyr_depths):
-            output_buff.append(self.line('{0}'.format(lyr_depth), 'Depth of bottom of SOM layer {0} [cm]'.format(lyr_num+1)))
-
         # MJM: modified to be cruder than MR original
-        # for each LUT write soil characteristics for each soil layer
-        # ===========================================================
-        for key in self._luts:      # typically: ['ara', 'gra', 'for', 'nat', 'mis', 'src']
-            for lyr_num in range(num_lyrs):    # typically: 2
-                strt_indx = 6*lyr_num
-                output_buff.append(self.line('{}'.format(soil[strt_indx]), 'C content [kgC/ha] for this soil under {0} in SOM layer {1}'.format(key, lyr_num+1)))
-                output_buff.append(self.line('{}'.format(soil[strt_indx + 1]), 'Bulk density [g/cm3] for this soil under {0} in SOM layer {1}'.format(key, lyr_num+1)))
-                output_buff.append(self.line('{}'.format(soil[strt_indx + 2]), 'pH for this soil under {0} in SOM layer {1}'.format(key, lyr_num+1)))
-                output_buff.append(self.line('{}'.format(soil[strt_indx + 3]), '% clay by weight for this soil under {0} in SOM layer {1}'.format(key, lyr_num+1)))
-                output_buff.append(self.line('{}'.format(soil[strt_indx + 4]), '% silt by weight for this soil under {0} in SOM layer {1}'.format(key, lyr_num+1)))
-                output_buff.append(self.line('{}'.format(soil[strt_indx + 5]), '% sand by weight for this soil under {0} in SOM layer {1}'.format(key, lyr_num+1)))
+        # lines which are the same for every cell are taken from the template, for each LUT write soil
+        # characteristics for each soil layer - typically 6 LUTs: ['ara', 'gra', 'for', 'nat', 'mis', 'src']
+        # ===================================================================================================
+        num_yrs = len(self.plantInput)
+        tmplt = self._fetch_template(num_lyrs, lyr_depths, num_yrs)
+        pad = self.pad
 
-        # Long term average plant C input
-        # ===============================
-        for key in self._luts:
-            output_buff.append(self.line('{}'.format(self.plant_inputs[key]),
-                        '{} long term average plant C input [kgC/ha/yr] (obsolete - use a dummy value)'.format(key)))
+        output_buff = [tmplt['head']]
+        for indx, sffx in tmplt['soil_slots']:
+            output_buff.append(pad('{}'.format(soil[indx])) + sffx)
+
+        output_buff.append(tmplt['lt_plnt_inpts'])
 
         # Long term average climate - 24 records
         # ======================================
-        for weather_rec in hist_weather_recs:
-            output_buff.append(weather_rec)
+        output_buff += hist_weather_recs
 
         # Other parameters
         # ================
-        output_buff.append(self.line('{0}'.format(round(latitude,3)), 'Latitude [decimal deg]'))
-        output_buff.append(self.line('{0}'.format(self.wt_at_strt), 'Water table depth at strt [cm]'))
-        if self.wt_max_stand >= 0:  # ensures backward compatibility
-            output_buff.append(self.line('{0}'.format(self.wt_max_stand), 'Max standing water [cm]'))
-        output_buff.append(self.line('{0}'.format(self.drain_class), 'Drainage class (not yet used)'))
-        output_buff.append(self.line('{0}'.format(self.c_accum_b4_change), 'C accumulated before change [kgC/ha/yr] (obsolete - use a dummy value)'))
-        output_buff.append(self.line('{0}'.format(self.ch4_b4_change), 'CH4 emission before change [kgC/ha/yr] (not used yet)'))
-        output_buff.append(self.line('{0}'.format(self.co2_b4_change), 'CO2 emission before change [kgC/ha/yr] (not used yet)'))
-        output_buff.append(self.line('{0}'.format(self.doc_loss_b4_change), 'DOC loss before change [kgC/ha/yr] (not used yet)'))
-        output_buff.append(self.line('{0}'.format(self.num_grow_seasons), 'Number of growing seasons to simulate'))
+        output_buff.append(pad('{0}'.format(round(latitude,3))) + tmplt['lat_sffx'])
+        output_buff.append(tmplt['othr_prms'])
 
         # Future land use and plant inputs
         # ================================
         # NB "(if plant input set to zero it is obtained from RothC instead)" has been omitted to reduce size of file
-        num_yrs = len(self.plantInput)
-        for year_num in range(num_yrs):
-            lu = self.landUses[year_num]
-            plnt_inpt = self.plantInput[year_num]
-            rec = '{}, {}'.format(lu, plnt_inpt)
-            comment = 'Year {} land use code and plant C input [kgC/ha/yr]'.format(year_num)
-            output_buff.append(self.line(rec, comment))
+        for lu, plnt_inpt, sffx in zip(self.landUses, self.plantInput, tmplt['pi_sffxs']):
+            output_buff.append(pad('{}, {}'.format(lu, plnt_inpt)) + sffx)
 
         # Climate file names
         # ==================
-        for year_num, fname in enumerate(self.met_fnames):
-            output_buff.append(self.line('{}{}'.format(met_rel_path, fname), 'Year {0} climate file'.format(year_num+1)))
+        for fname, sffx in tmplt['met_slots']:
+            output_buff.append(pad(met_rel_path + fname) + sffx)
 
+        return output_buff
+
+    def write_lines(self, sim_dir, output_buff, input_fname='input.txt'):
+        """
+        lines are written separately from their creation so that writing can be done by a background thread
+        """
         path_input_txt = join(normpath(sim_dir), input_fname)
         try:
             fhand = open(path_input_txt, 'w')
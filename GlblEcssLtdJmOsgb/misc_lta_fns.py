@@ -16,7 +16,7 @@ from os.path import isdir, join, isfile
 from time import strftime, sleep
 from csv import writer
 
-from cvrtcoord import OSGB36toWGS84, WGS84toOSGB36
+from cvrtcoord_arrays import OSGB36toWGS84_arrays, WGS84toOSGB36_arrays
 
 OSGB_FNAME = 'coords_osgb'
 WGS84_FNAME = 'coords_wgs84'
@@ -46,7 +46,15 @@ def write_coords_check_file(log_dir, grid_cells):
     hfry_writer = writer(hfry_obj, delimiter=',')
     hfry_writer.writerow(['grid_ref', 'easting', 'nrthing', 'hf_lat', 'hf_lon', 'lat', 'lon', 'hf_esting', 'hf_nrthng'])
 
-    for grid_ref in grid_cells.keys():
+    # convert coordinates of all grid cells in one call for each direction
+    # =====================================================================
+    grid_refs = list(grid_cells.keys())
+    hf_estings, hf_nrthngs = WGS84toOSGB36_arrays([grid_cells[grid_ref].lon for grid_ref in grid_refs],
+                                                  [grid_cells[grid_ref].lat for grid_ref in grid_refs])
+    hf_lons, hf_lats = OSGB36toWGS84_arrays([grid_cells[grid_ref].easting for grid_ref in grid_refs],
+                                            [grid_cells[grid_ref].nrthing for grid_ref in grid_refs])
+
+    for indx, grid_ref in enumerate(grid_refs):
         grid_cell = grid_cells[grid_ref]
 
         lat, lon = grid_cell.lat, grid_cell.lon
@@ -55,8 +63,8 @@ def write_coords_check_file(log_dir, grid_cells):
         easting, nrthing = grid_cell.easting, grid_cell.nrthing
         osgb_writer.writerow([easting, nrthing, grid_ref])
 
-        hf_esting, hf_nrthng = WGS84toOSGB36(lon, lat)
-        hf_lon, hf_lat = OSGB36toWGS84(easting, nrthing)
+        hf_esting, hf_nrthng = hf_estings[indx].item(), hf_nrthngs[indx].item()
+        hf_lon, hf_lat = hf_lons[indx].item(), hf_lats[indx].item()
         hfry_writer.writerow([grid_ref, easting, nrthing, hf_lat, hf_lon, lat, lon, hf_esting, hf_nrthng])
 
     osgb_obj.close()
@@ -0,0 +1,190 @@
+#-------------------------------------------------------------------------------
+# Name:        pi_pack_fns.py
+# Purpose:     consolidate a directory of plant input CSV files into a single columnar store
+# Author:      Mike Martin
+# Created:     18/10/2026
+# Licence:     <your licence>
+# Description: usage: python pi_pack_fns.py plnt_inpt_dir [plnt_inpt_dir ...]
+#              writes pi_pack.npy, a memory-mappable array of shape (ncells, nyears) of plant inputs, and
+#              pi_pack_index.npz comprising the UIDs, the year axis shared by all cells and integer flags
+#              plant inputs are stored as float32 unless this would alter any value in which case float64 is used
+#              files whose years differ from the shared year axis are reported and left out of the pack
+#              the index also records the number and newest modification time of the CSV files when packed
+#              a pack is ignored, and the CSV files read instead, if the CSV files have changed since it was written
+#              the pack must then be rebuilt
+#-------------------------------------------------------------------------------
+#
+__prog__ = 'pi_pack_fns.py'
+__version__ = '0.0.1'
+__author__ = 's03mm5'
+
+import sys
+from os.path import join, isfile
+from csv import reader
+from time import time
+
+from numpy import array, float32, float64, load as np_load, save as np_save, savez as np_savez
+
+from lta_pack_fns import is_int_str, scan_csv_dir, read_pack_stamp, check_pack_stamp
+
+PI_PACK_FN = 'pi_pack.npy'
+PI_INDX_FN = 'pi_pack_index.npz'
+
+WARN_STR = '*** Warning *** '
+
+_pi_packs = {}     # packs keyed by plant input directory, None where there is no pack - see fetch_pi_pack
+
+class PiPack(object, ):
+    """
+    read only access to a packed plant input directory
+    """
+    def __init__(self, plnt_inpt_dir):
+        """
+        the data array is memory mapped so only rows which are read are loaded
+        """
+        self.plnt_inpt_dir = plnt_inpt_dir
+        self.data = np_load(join(plnt_inpt_dir, PI_PACK_FN), mmap_mode='r')
+
+        indx = np_load(join(plnt_inpt_dir, PI_INDX_FN))
+        self.yrs = indx['yrs'].tolist()
+        self.int_flags = indx['int_flags']
+        self.uid_indx = {uid: irow for irow, uid in enumerate(indx['uids'].tolist())}
+        self.float32_flag = self.data.dtype == float32
+        self.stamp = read_pack_stamp(indx)
+
+    def __contains__(self, uid):
+        return uid in self.uid_indx
+
+    def __len__(self):
+        return len(self.uid_indx)
+
+    def read(self, uid):
+        """
+        counterpart of _read_plnt_inpt_csv_file
+        """
+        irow = self.uid_indx[uid]
+        row = self.data[irow]
+        if self.float32_flag:
+            pis = [float(val) for val in row.astype(str)]   # shortest representation of each float32 value
+        else:
+            pis = row.tolist()
+
+        if self.int_flags[irow]:
+            pis = [int(val) for val in pis]
+
+        return {'yrs': list(self.yrs), 'pis': pis}
+
+def fetch_pi_pack(plnt_inpt_dir):
+    """
+    return PiPack for plnt_inpt_dir or None if the directory has not been packed or the pack is out of date
+    result is retained for the run
+    """
+    if plnt_inpt_dir not in _pi_packs:
+        if isfile(join(plnt_inpt_dir, PI_PACK_FN)) and isfile(join(plnt_inpt_dir, PI_INDX_FN)):
+            pi_pack = PiPack(plnt_inpt_dir)
+            if not check_pack_stamp(plnt_inpt_dir, pi_pack.uid_indx, pi_pack.stamp, 'plant input', __prog__):
+                pi_pack = None
+            _pi_packs[plnt_inpt_dir] = pi_pack
+        else:
+            _pi_packs[plnt_inpt_dir] = None
+
+    return _pi_packs[plnt_inpt_dir]
+
+def install_pi_pack(plnt_inpt_dir, pack_flag):
+    """
+    accept the outcome of fetch_pi_pack in another process, pack_flag being True if a valid pack was found,
+    so that the directory is not scanned again e.g. by each worker process
+    """
+    if plnt_inpt_dir not in _pi_packs:
+        _pi_packs[plnt_inpt_dir] = PiPack(plnt_inpt_dir) if pack_flag else None
+
+    return
+
+def pack_pi_dir(plnt_inpt_dir):
+    """
+    read every <UID>.csv file in plnt_inpt_dir and write the pack and index files to plnt_inpt_dir
+    """
+    start_time = time()
+    csv_uids, mtime_ns = scan_csv_dir(plnt_inpt_dir)
+    pi_csvs = sorted(uid + '.csv' for uid in csv_uids)
+    print('Packing {} plant input files from {}'.format(len(pi_csvs), plnt_inpt_dir))
+    if len(pi_csvs) == 0:
+        return
+
+    yrs = None
+    data = []
+    int_flags = []
+    uids = []
+    nbad = 0
+    for pi_csv in pi_csvs:
+        try:
+            yrs_csv, pis, int_flag = _parse_pi_csv(join(plnt_inpt_dir, pi_csv))
+        except (ValueError, IndexError) as err:
+            print(WARN_STR + 'could not parse ' + pi_csv + ' - ' + str(err))
+            nbad += 1
+            continue
+
+        if yrs is None:
+            yrs = yrs_csv
+        elif yrs_csv != yrs:
+            print(WARN_STR + 'years in ' + pi_csv + ' differ from those of the other plant input files')
+            nbad += 1
+            continue
+
+        uids.append(pi_csv[:-4])
+        data.append(pis)
+        int_flags.append(int_flag)
+
+    data = array(data, dtype=float64).reshape(len(uids), len(yrs) if yrs is not None else 0)
+
+    # float32 is used only if every value survives the round trip
+    # ============================================================
+    data_f32 = data.astype(float32)
+    if all(float(val) == orig for val, orig in zip(data_f32.astype(str).ravel(), data.ravel())):
+        data = data_f32
+
+    np_save(join(plnt_inpt_dir, PI_PACK_FN), data)
+    np_savez(join(plnt_inpt_dir, PI_INDX_FN), uids=array(uids, dtype=str), yrs=array(yrs),
+                        int_flags=array(int_flags, dtype=bool), ncsvs=len(pi_csvs), mtime_ns=mtime_ns)
+    _pi_packs.pop(plnt_inpt_dir, None)
+
+    print('Packed {} plant input files with {} years as {} - {} files left out in {:.1f} seconds'
+                                        .format(len(uids), data.shape[1], data.dtype, nbad, time() - start_time))
+    return
+
+def _parse_pi_csv(pi_csv):
+    """
+    read a plant input file in a single pass
+    return list of years, list of plant inputs and a flag which is True when all plant inputs are integers
+    """
+    with open(pi_csv, 'r', newline='') as fobj:
+        recs = list(reader(fobj))
+
+    hdr = [metric.strip() for metric in recs[0]]
+    icol_yr = hdr.index('year')
+    icol_pi = hdr.index('PI_kg_ha')
+
+    yrs = [int(rec[icol_yr]) for rec in recs[1:] if len(rec) > 0]
+    strs = [rec[icol_pi].strip() for rec in recs[1:] if len(rec) > 0]
+    int_flag = all(is_int_str(val) for val in strs)
+
+    return yrs, [float(val) for val in strs], int_flag
+
+def main(argv=None):
+    """
+    pack each plant input directory given on the command line
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if len(argv) == 0:
+        print('usage: python ' + __prog__ + ' plnt_inpt_dir [plnt_inpt_dir ...]')
+        return 1
+
+    for plnt_inpt_dir in argv:
+        pack_pi_dir(plnt_inpt_dir)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -15,14 +15,21 @@ __prog__ = 'prepare_ecosse_files.py'
 # Version history
 # ---------------
 #
-from os.path import join, lexists, basename, isdir, isfile
-from os import makedirs
-from shutil import copyfile, copytree, copy as copy_file
+from os.path import join, lexists, basename, isdir, isfile, abspath, samefile
+from os import makedirs, link, symlink, getpid, remove, replace, stat
+from glob import glob
+from hashlib import blake2b
+from shutil import copyfile, copytree, copy2
 from time import time
+from datetime import timedelta
+from json import dumps as json_dumps
+from threading import BoundedSemaphore, Lock
+from concurrent.futures import ThreadPoolExecutor
 
-from PyQt5.QtWidgets import QApplication
+from headless_fns import process_events
 
 from grid_osgb_classes_and_fns import read_lta_file
+from stage_timers import stage_timer
 from glbl_ecss_cmmn_funcs import write_kml_file, write_manifest_file, input_txt_line_layout, write_signature_file
 
 sleepTime = 5
@@ -30,9 +37,308 @@ sleepTime = 5
 ERROR_STR = '*** Error *** '
 WARN_STR = '*** Warning *** '
 
-def make_ecss_files_from_cell(form, climgen, coord, lta_csv,  wthr_dir, ltd_data, lat, lon, soil_rec):
+WTHR_LINK_MODES = ['copy', 'hardlink', 'symlink']    # ways of populating the weather directory of a coordinate
+
+_warned_modes = set()    # link modes and file types for which a fall back to copying has been reported
+
+SPIN_MODES = ['0', '1', '2']
+SPIN_MODE_LINE = 15     # index of line of Model_Switches.dat whose first character is the spin up mode
+SHARED_MDL_SWTCHS_FN = 'Model_Switches_shared.dat'  # in the study directory, hard linked into each cell
+SPIN_MDL_SWTCHS_FN = 'Model_Switches_spin{}.dat'    # in the study directory, one per spin up mode
+
+WRITER_QUEUE_PER_THREAD = 4     # cells waiting to be written per writer thread before submit blocks
+MAX_ERRORS_REPORTED = 5
+
+PRGRSS_INTRVL = 5       # seconds between progress reports
+METRICS_FN = 'progress_metrics.jsonl'
+
+_prgrss = {'start_time': None, 'last_icells': 0, 'last_nvld': 0, 'metrics_fn': None}   # see start_progress
+
+class CellWriter(object, ):
+    """
+    bounded pool of threads which write the files of each cell while subsequent cells are prepared
+    submit blocks when the queue is full; errors are collected and returned by drain
+    """
+    def __init__(self, n_threads):
+        """
+        C
+        """
+        self.nslots = WRITER_QUEUE_PER_THREAD * n_threads
+        self.slots = BoundedSemaphore(self.nslots)
+        self.lock = Lock()
+        self.errors = []
+        self.executor = ThreadPoolExecutor(n_threads, thread_name_prefix='cell_writer')
+
+    def submit(self, label, func, *args):
+        """
+        queue func(*args), label identifies the task in any error message
+        """
+        self.slots.acquire()
+        self.executor.submit(self._run, label, func, args)
+
+        return
+
+    def _run(self, label, func, args):
+        """
+        runs in a writer thread
+        """
+        try:
+            func(*args)
+        except Exception as err:
+            with self.lock:
+                self.errors.append(label + ': ' + str(err))
+        finally:
+            self.slots.release()
+
+        return
+
+    def drain(self):
+        """
+        wait until all queued tasks have completed then return and clear the list of error messages
+        """
+        for islot in range(self.nslots):
+            self.slots.acquire()
+        for islot in range(self.nslots):
+            self.slots.release()
+
+        with self.lock:
+            errors, self.errors = self.errors, []
+
+        return errors
+
+    def close(self):
+        """
+        drain then stop the writer threads
+        """
+        errors = self.drain()
+        self.executor.shutdown()
+
+        return errors
+
+JOURNAL_DIR = 'journal'     # subdirectory of the study directory which holds the journal files
+JOURNAL_PREFIX = 'generated_cells_'    # journal files are named <prefix><process id>.jnl
+JOURNAL_MERGED_FN = JOURNAL_PREFIX + 'merged.jnl'   # journal files of completed runs are merged into this file
+
+class CellJournal(object, ):
+    """
+    journal of cells whose files have been written together with a fingerprint of their content
+    each process appends to its own journal file so that worker processes need no coordination
+    """
+    def __init__(self, study_dir, dflt_mdl_swtchs, resume_flag):
+        """
+        when resuming the completed cells are read from existing journal files otherwise these files are removed
+        """
+        self.jrnl_dir = join(study_dir, JOURNAL_DIR)
+        makedirs(self.jrnl_dir, exist_ok=True)
+        self.done = {}
+        jrnl_fns = self._list_jrnl_fns()
+        if resume_flag:
+            _read_jrnl_fns(jrnl_fns, self.done)
+        else:
+            for jrnl_fn in jrnl_fns:
+                remove(jrnl_fn)
+
+        if resume_flag:
+            print('Read {} completed cells from {} journal files'.format(len(self.done), len(jrnl_fns)))
+            process_events()
+
+        # changing the default Model_Switches file invalidates every cell
+        # ===============================================================
+        with open(dflt_mdl_swtchs, 'rb') as fobj:
+            self.base_hash = blake2b(fobj.read(), digest_size=16).digest()
+
+        self.pid = None
+        self.fobj = None
+        self.lock = Lock()
+
+    def __getstate__(self):
+        """
+        the journal file and lock remain with the process which created them
+        """
+        state = self.__dict__.copy()
+        state['pid'], state['fobj'], state['lock'] = None, None, None
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = Lock()
+
+    def fingerprint(self, input_lines, cell_dtls):
+        """
+        digest of the content of the cell's files - the contents of the weather files are not included
+        """
+        hash_obj = blake2b(self.base_hash, digest_size=16)
+        hash_obj.update(repr(cell_dtls).encode())
+        if input_lines is not None:
+            hash_obj.update(''.join(input_lines).encode())
+
+        return hash_obj.hexdigest()
+
+    def is_done(self, coord, fngrprnt, cell_fns):
+        """
+        True if the files of the cell have already been written with the same content and are still present
+        cell_fns are the paths which must exist, if any is missing the cell is dropped from the journal so that
+        it is written again
+        """
+        if self.done.get(coord) != fngrprnt:
+            return False
+
+        if not all(lexists(cell_fn) for cell_fn in cell_fns):
+            del self.done[coord]
+            return False
+
+        return True
+
+    def record(self, coord, fngrprnt):
+        """
+        called once all files of the cell have been written - may be called from a writer thread
+        """
+        with self.lock:
+            if self.pid != getpid():
+                self.pid = getpid()
+                self.fobj = open(join(self.jrnl_dir, JOURNAL_PREFIX + str(self.pid) + '.jnl'), 'a')
+            self.fobj.write(coord + ' ' + fngrprnt + '\n')
+            self.fobj.flush()
+
+        return
+
+    def close(self):
+        """
+        C
+        """
+        if self.fobj is not None:
+            self.fobj.close()
+            self.fobj = None
+
+        return
+
+    def merge(self):
+        """
+        called once the run is complete, when worker processes have exited: the journal files of this and previous
+        runs are combined into a single file and the per process files removed
+        """
+        self.close()
+        jrnl_fns = self._list_jrnl_fns()
+        done = {}
+        _read_jrnl_fns(jrnl_fns, done)
+
+        merged_fn = join(self.jrnl_dir, JOURNAL_MERGED_FN)
+        tmp_fn = merged_fn + '.' + str(getpid())
+        with open(tmp_fn, 'w') as fobj:
+            fobj.writelines(coord + ' ' + fngrprnt + '\n' for coord, fngrprnt in done.items())
+        replace(tmp_fn, merged_fn)
+
+        for jrnl_fn in jrnl_fns:
+            if jrnl_fn != merged_fn:
+                remove(jrnl_fn)
+
+        return
+
+    def _list_jrnl_fns(self):
+        """
+        journal files with the merged file first so that records of later runs take precedence
+        """
+        jrnl_fns = glob(join(self.jrnl_dir, JOURNAL_PREFIX + '*.jnl'))
+
+        return sorted(jrnl_fns, key=lambda jrnl_fn: basename(jrnl_fn) != JOURNAL_MERGED_FN)
+
+def _read_jrnl_fns(jrnl_fns, done):
+    """
+    add the records of the journal files to dictionary done, later records replace earlier ones
+    """
+    for jrnl_fn in jrnl_fns:
+        with open(jrnl_fn, 'r') as fobj:
+            for line in fobj:
+                rec = line.split()
+                if len(rec) == 2:       # ignore any record truncated by an interrupted run
+                    done[rec[0]] = rec[1]
+
+    return
+
+def fetch_cell_journal(form, study_dir):
+    """
+    return CellJournal for the study if a journal has been requested, so that a later run can resume, or the run
+    is itself resuming otherwise None
+    """
+    if not (form.sttngs['journal_flag'] or form.sttngs['resume_flag']):
+        return None
+
+    makedirs(study_dir, exist_ok=True)
+
+    return CellJournal(study_dir, form.sttngs['dflt_mdl_swtchs'], form.sttngs['resume_flag'])
+
+def fetch_cell_writer(form):
+    """
+    return CellWriter if background writing has been requested otherwise None
+    """
+    n_writers = int(form.sttngs['n_writers'])
+    if n_writers > 0:
+        return CellWriter(n_writers)
+    else:
+        return None
+
+def report_write_errors(errors):
+    """
+    report errors collected by CellWriter, returns True if there were none
+    """
+    nerrors = len(errors)
+    if nerrors == 0:
+        return True
+
+    print(ERROR_STR + '{} cells could not be written:'.format(nerrors))
+    for error in errors[:MAX_ERRORS_REPORTED]:
+        print('\t' + error)
+    if nerrors > MAX_ERRORS_REPORTED:
+        print('\t...')
+    process_events()
+
+    return False
+
+def make_shared_mdl_swtchs(form, study_dir):
+    """
+    when Model_Switches files are shared write a Model_Switches file for each spin up mode to the study directory
+    together with the shared file, a copy of the default file, to which the Model_Switches file of each cell is
+    hard linked so that the spin up mode of every cell is set by rewriting the shared file
+    the shared file is rewritten in place so that cells linked to it by a previous run remain linked
+    """
+    if not form.sttngs['shared_mdl_swtchs_flag']:
+        return
+
+    with open(form.sttngs['dflt_mdl_swtchs'], 'rb') as fobj:
+        content = fobj.read()
+
+    makedirs(study_dir, exist_ok=True)
+    lines = content.splitlines(keepends=True)
+    if len(lines) > SPIN_MODE_LINE:
+        for spin_mode in SPIN_MODES:
+            lines[SPIN_MODE_LINE] = spin_mode.encode() + lines[SPIN_MODE_LINE][1:]
+            rewrite_file(join(study_dir, SPIN_MDL_SWTCHS_FN.format(spin_mode)), b''.join(lines))
+    else:
+        print(WARN_STR + 'default Model_Switches file has no spin up mode line - spin up mode files not written')
+        process_events()
+
+    rewrite_file(join(study_dir, SHARED_MDL_SWTCHS_FN), content)
+
+    return
+
+def rewrite_file(fname, content):
+    """
+    replace the content of fname, if it exists, without replacing the file itself so that hard links to it remain
+    """
+    with open(fname, 'r+b' if isfile(fname) else 'wb') as fobj:
+        fobj.write(content)
+        fobj.truncate()
+
+    return
+
+def make_ecss_files_from_cell(form, climgen, coord, lta_csv,  wthr_dir, ltd_data, lat, lon, soil_rec, writer=None,
+                                                                                                    journal=None):
     """
     generate sets of Ecosse files for a site
+    if writer is a CellWriter then the content of the input file is created here and the files written by the writer
+    if journal is a CellJournal then files are not written for a cell already journalled with the same content
+    returns False if writing was skipped for this reason otherwise True
     """
     func_name = 'make_ecss_files_from_cell'
 
@@ -45,7 +351,8 @@ def make_ecss_files_from_cell(form, climgen, coord, lta_csv,  wthr_dir, ltd_data
 
     # write stanza for input.txt file consisting of long term average climate
     # =======================================================================
-    lta = read_lta_file(lta_csv)
+    with stage_timer('lta_read'):
+        lta = read_lta_file(lta_csv)
     hist_wthr_recs = []
     for imnth, month in enumerate(climgen.months):
         hist_wthr_recs.append(input_txt_line_layout('{}'.format(lta['precip'][imnth]), \
@@ -59,44 +366,233 @@ def make_ecss_files_from_cell(form, climgen, coord, lta_csv,  wthr_dir, ltd_data
     # =============================
     area_for_soil = area
     sim_dir = join(sims_dir, climgen.study, coord)
-    if not lexists(sim_dir):
-        makedirs(sim_dir)
 
     # met_rel_path = '..\\..\\' + climgen.rcp_realis + '\\' + coord + '\\'
     wthr_node_path = climgen.rcp_realis + '\\' + coord + '\\'
     met_rel_path = '..\\..\\' + wthr_node_path
-    ltd_data.write(sim_dir, soil_rec, lat, hist_wthr_recs, met_rel_path)
+    with stage_timer('input_lines'):
+        input_lines = ltd_data.make_lines(sim_dir, soil_rec, lat, hist_wthr_recs, met_rel_path)
+
+    if form.sttngs['shared_mdl_swtchs_flag']:
+        shared_mdl_swtchs = join(sims_dir, climgen.study, SHARED_MDL_SWTCHS_FN)
+    else:
+        shared_mdl_swtchs = None
+
+    cell_dtls = (form.study, fut_clim_scen, form.sttngs['dflt_mdl_swtchs'], shared_mdl_swtchs,
+                                    form.sttngs['wthr_link_mode'], coord, lat, lon, soil_rec, province, area_for_soil,
+                                                                            wthr_dir, join(sims_dir, wthr_node_path))
+    fngrprnt = None
+    if journal is not None:
+        fngrprnt = journal.fingerprint(input_lines, cell_dtls)
+        cell_fns = [join(sim_dir, 'input.txt'), join(sim_dir, basename(form.sttngs['dflt_mdl_swtchs'])),
+                                                                                join(sims_dir, wthr_node_path)]
+        if journal.is_done(coord, fngrprnt, cell_fns):
+            return False
+
+    if writer is None:
+        _write_cell_files(ltd_data, sim_dir, input_lines, cell_dtls, journal, fngrprnt)
+    else:
+        writer.submit(coord, _write_cell_files, ltd_data, sim_dir, input_lines, cell_dtls, journal, fngrprnt)
+
+    return True
+
+def _write_cell_files(ltd_data, sim_dir, input_lines, cell_dtls, journal=None, fngrprnt=None):
+    """
+    write the files of a cell - can be run in a writer thread - see CellWriter
+    the cell is journalled only once all its files have been written
+    """
+    study, fut_clim_scen, dflt_mdl_swtchs, shared_mdl_swtchs, wthr_link_mode, coord, lat, lon, soil_rec, province, \
+                                                                area_for_soil, wthr_dir, sims_wthr_dir = cell_dtls
+    if not lexists(sim_dir):
+        makedirs(sim_dir, exist_ok=True)
+
+    if input_lines is not None:
+        with stage_timer('input_write'):
+            ltd_data.write_lines(sim_dir, input_lines)
 
-    sims_wthr_dir = join(sims_dir, wthr_node_path)
     if not isdir(sims_wthr_dir):
-        copytree(wthr_dir, sims_wthr_dir)
+        with stage_timer('wthr_copy'):
+            _make_sims_wthr_dir(wthr_dir, sims_wthr_dir, wthr_link_mode)
 
     # write kml and signature files
     # =============================
-    write_kml_file(sim_dir, coord, coord, lat, lon)
-    write_signature_file(sim_dir, coord, soil_rec, lat, lon, province)
+    with stage_timer('kml_signature'):
+        write_kml_file(sim_dir, coord, coord, lat, lon)
+        write_signature_file(sim_dir, coord, soil_rec, lat, lon, province)
 
-    # copy across Model_Switches.dat file
-    # ===================================
-    out_mdl_swtchs = join(sim_dir, basename(form.sttngs['dflt_mdl_swtchs']))
-    copyfile(form.sttngs['dflt_mdl_swtchs'], out_mdl_swtchs)
+    # copy across Model_Switches.dat file or link to the shared file of the study
+    # ==========================================================================
+    out_mdl_swtchs = join(sim_dir, basename(dflt_mdl_swtchs))
+    with stage_timer('mdl_swtchs_copy'):
+        if shared_mdl_swtchs is None:
+            _copy_mdl_swtchs(dflt_mdl_swtchs, out_mdl_swtchs)
+        else:
+            _link_mdl_swtchs(shared_mdl_swtchs, out_mdl_swtchs)
 
     # manifest file is essential for subsequent processing
     # ====================================================
     soil_list = list([soil_rec + [100.0]])
-    write_manifest_file(form.study, fut_clim_scen, sim_dir, soil_list, coord, lat, lon, area_for_soil, osgb_flag=True)
+    with stage_timer('manifest_write'):
+        write_manifest_file(study, fut_clim_scen, sim_dir, soil_list, coord, lat, lon, area_for_soil, osgb_flag=True)
+
+    if journal is not None:
+        journal.record(coord, fngrprnt)
+
+    return
+
+def _copy_mdl_swtchs(dflt_mdl_swtchs, out_mdl_swtchs):
+    """
+    a Model_Switches file linked to a shared file by a previous run is removed first so the shared file is untouched
+    """
+    try:
+        if stat(out_mdl_swtchs).st_nlink > 1:
+            remove(out_mdl_swtchs)
+    except FileNotFoundError:
+        pass
+
+    copyfile(dflt_mdl_swtchs, out_mdl_swtchs)
+
+    return
+
+def _link_mdl_swtchs(shared_mdl_swtchs, out_mdl_swtchs):
+    """
+    hard link the Model_Switches file of a cell to the shared file, copying if the link cannot be made
+    """
+    if lexists(out_mdl_swtchs):
+        if samefile(shared_mdl_swtchs, out_mdl_swtchs):
+            return
+        remove(out_mdl_swtchs)
+
+    try:
+        link(shared_mdl_swtchs, out_mdl_swtchs)
+    except OSError as err:
+        _report_link_fallback('hardlink', err, 'Model_Switches files')
+        copyfile(shared_mdl_swtchs, out_mdl_swtchs)
+
+    return
+
+def _make_sims_wthr_dir(wthr_dir, sims_wthr_dir, link_mode):
+    """
+    populate the weather directory of a coordinate from the weather store according to link_mode:
+        copy        copy the directory tree
+        hardlink    create a directory of hard links to the weather files
+        symlink     create a single symbolic link to the weather directory
+    links share their content with the weather store so must not be edited in place
+    either link mode falls back to copying when linking is not possible e.g. across filesystems
+    """
+    if link_mode == 'symlink':
+        try:
+            symlink(abspath(wthr_dir), sims_wthr_dir, target_is_directory=True)
+            return
+        except OSError as err:
+            _report_link_fallback(link_mode, err)
+
+    elif link_mode == 'hardlink':
+        copytree(wthr_dir, sims_wthr_dir, copy_function=_link_or_copy)
+        return
+
+    copytree(wthr_dir, sims_wthr_dir)
+
+    return
+
+def _link_or_copy(src, dst):
+    """
+    copy_function for copytree which hard links src to dst, copying if the link cannot be made
+    """
+    try:
+        link(src, dst)
+    except OSError as err:
+        _report_link_fallback('hardlink', err)
+        copy2(src, dst)
+
+    return dst
+
+def _report_link_fallback(link_mode, err, file_type='weather files'):
+    """
+    warn once per link mode and type of file that files are being copied instead
+    """
+    if (link_mode, file_type) not in _warned_modes:
+        _warned_modes.add((link_mode, file_type))
+        print(WARN_STR + 'could not ' + link_mode + ' ' + file_type + ' - ' + str(err) + ' - will copy instead')
+        process_events()
 
     return
 
-def update_progress(last_time, w_prgrss, ncells_vld, icells, ngrid_cells):
+def start_progress(metrics_fn=None):
+    """
+    reset the counts from which update_progress calculates rates and return the start time
+    if metrics_fn is supplied each progress report is also written to it as a line of JSON
     """
+    start_time = time()
+    _prgrss.update({'start_time': start_time, 'last_icells': 0, 'last_nvld': 0, 'metrics_fn': None})
+    if metrics_fn is not None:
+        try:
+            open(metrics_fn, 'w').close()
+        except OSError as err:
+            print(WARN_STR + 'could not create metrics file ' + metrics_fn + ' - ' + str(err))
+        else:
+            _prgrss['metrics_fn'] = metrics_fn
 
+    return start_time
+
+def update_progress(last_time, w_prgrss, ncells_vld, icells, ngrid_cells, n_cells_max=None, final_flag=False):
+    """
+    report cells scanned and valid cells per second since the previous report and since the start, together with
+    time remaining until either ngrid_cells are scanned or n_cells_max valid cells are found
+    final_flag forces a report e.g. on completion
     """
     new_time = time()
-    if new_time - last_time > 5:
-        prcnt_cells = round(100* (icells/ngrid_cells), 2)
-        w_prgrss.setText('Found: {} valid coords\t% cells processed: {}'.format(ncells_vld, prcnt_cells))
-        QApplication.processEvents()
+    if new_time - last_time > PRGRSS_INTRVL or final_flag:
+        if _prgrss['start_time'] is None:
+            _prgrss['start_time'] = last_time
+        metrics = _progress_metrics(new_time, new_time - last_time, ncells_vld, icells, ngrid_cells, n_cells_max)
+        metrics['final'] = final_flag
+
+        prcnt_cells = round(100* (icells/ngrid_cells), 2) if ngrid_cells > 0 else 100.0
+        eta = 'unknown' if metrics['eta_secs'] is None else str(timedelta(seconds=round(metrics['eta_secs'])))
+        w_prgrss.setText('Found: {} valid coords\t% cells processed: {}'.format(ncells_vld, prcnt_cells)
+                + '\tcells/s: {:.1f} ({:.1f} now)\tvalid/s: {:.1f} ({:.1f} now)\tETA: {}'
+                .format(metrics['cells_per_sec'], metrics['cells_per_sec_now'], metrics['vld_per_sec'],
+                                                                                metrics['vld_per_sec_now'], eta))
+        process_events()
+
+        if _prgrss['metrics_fn'] is not None:
+            with open(_prgrss['metrics_fn'], 'a') as fmetrics:
+                fmetrics.write(json_dumps(metrics) + '\n')
+
+        _prgrss['last_icells'], _prgrss['last_nvld'] = icells, ncells_vld
         last_time = new_time
 
-    return last_time
\ No newline at end of file
+    return last_time
+
+def _progress_metrics(new_time, scnds_intrvl, ncells_vld, icells, ngrid_cells, n_cells_max):
+    """
+    rates are cumulative unless suffixed _now; the time remaining is based on cumulative rates
+    """
+    scnds_elapsed = new_time - _prgrss['start_time']
+    cells_per_sec = icells / scnds_elapsed if scnds_elapsed > 0 else 0.0
+    vld_per_sec = ncells_vld / scnds_elapsed if scnds_elapsed > 0 else 0.0
+
+    etas = []
+    if cells_per_sec > 0:
+        etas.append(max(0, ngrid_cells - icells) / cells_per_sec)
+    if n_cells_max is not None and n_cells_max < ngrid_cells and vld_per_sec > 0:
+        etas.append(max(0, n_cells_max - ncells_vld) / vld_per_sec)
+
+    metrics = {'time': new_time, 'elapsed_secs': scnds_elapsed, 'cells_scanned': icells,
+               'ngrid_cells': ngrid_cells, 'cells_vld': ncells_vld, 'n_cells_max': n_cells_max,
+               'cells_per_sec': cells_per_sec, 'vld_per_sec': vld_per_sec,
+               'cells_per_sec_now': (icells - _prgrss['last_icells']) / scnds_intrvl if scnds_intrvl > 0 else 0.0,
+               'vld_per_sec_now': (ncells_vld - _prgrss['last_nvld']) / scnds_intrvl if scnds_intrvl > 0 else 0.0,
+               'eta_secs': min(etas) if len(etas) > 0 else None}
+
+    return metrics
+
+def fetch_metrics_fn(form, study_dir):
+    """
+    return path of the progress metrics file if setting metrics_flag is set, otherwise None
+    """
+    if form.sttngs['metrics_flag']:
+        return join(study_dir, METRICS_FN)
+    else:
+        return None
@@ -0,0 +1,265 @@
+#-------------------------------------------------------------------------------
+# Name:        spin_archive_fns.py
+# Purpose:     keep the spinup files of a spinup directory in a single append-only archive
+# Author:      Mike Martin
+# Created:     18/10/2026
+# Licence:     <your licence>
+# Description: usage: python spin_archive_fns.py spin_dir [--keep]
+#              packs the spinup_<UID>.dat files of spin_dir into spin_archive.dat, the contents of the files one
+#              after another, and spin_archive_index.txt, one line per file comprising UID, offset and length
+#              files are removed once packed unless --keep is given
+#              the archive is only ever appended to; where a UID appears more than once the last entry is used
+#              so the space taken by superseded spinup files is not recovered
+#-------------------------------------------------------------------------------
+#
+__prog__ = 'spin_archive_fns.py'
+__version__ = '0.0.1'
+__author__ = 's03mm5'
+
+import sys
+from os import scandir, remove, stat
+from os.path import join, isfile
+from mmap import mmap, ACCESS_READ
+from threading import Lock
+from time import time
+
+SPIN_ARCHIVE_FN = 'spin_archive.dat'
+SPIN_INDX_FN = 'spin_archive_index.txt'
+SPIN_PREFIX = 'spinup_'
+SPIN_SFFX = '.dat'
+
+WARN_STR = '*** Warning *** '
+
+def read_spin_index(spin_dir):
+    """
+    return dictionary of offset and length of each spinup file in the archive keyed by UID
+    entries which do not parse or extend beyond the end of the data file e.g. following an interrupted append
+    are rejected and reported
+    """
+    data_size = stat(join(spin_dir, SPIN_ARCHIVE_FN)).st_size
+    indx = {}
+    nbad = 0
+    with open(join(spin_dir, SPIN_INDX_FN), 'r') as findx:
+        for line in findx:
+            rec = line.split()
+            try:
+                if len(rec) != 3 or not line.endswith('\n'):
+                    raise ValueError
+                offset, length = int(rec[1]), int(rec[2])
+                if offset < 0 or length < 0 or offset + length > data_size:
+                    raise ValueError
+            except ValueError:
+                nbad += 1
+                continue
+            indx[rec[0]] = (offset, length)
+
+    if nbad > 0:
+        print(WARN_STR + 'rejected {} bad entries in spinup archive index '.format(nbad)
+                                                                                + join(spin_dir, SPIN_INDX_FN))
+
+    return indx
+
+def _trim_spin_index(indx_fn):
+    """
+    truncate an index which does not end with a newline, following an interrupted append, to its last complete
+    line so that the next entry starts on a line of its own
+    """
+    if not isfile(indx_fn):
+        return
+
+    with open(indx_fn, 'r+b') as findx:
+        size = findx.seek(0, 2)
+        end = size
+        while end > 0:
+            start = max(0, end - 4096)
+            findx.seek(start)
+            chunk = findx.read(end - start)
+            if end == size and chunk.endswith(b'\n'):
+                return
+            inl = chunk.rfind(b'\n')
+            if inl >= 0:
+                end = start + inl + 1
+                break
+            end = start
+
+        if end < size:
+            findx.truncate(end)
+            print(WARN_STR + 'removed incomplete last entry of spinup archive index ' + indx_fn)
+
+    return
+
+def is_spin_archive(spin_dir):
+    """
+    True if spin_dir has a spinup archive
+    """
+    return isfile(join(spin_dir, SPIN_ARCHIVE_FN)) and isfile(join(spin_dir, SPIN_INDX_FN))
+
+class SpinArchive(object, ):
+    """
+    read only access to the spinup archive of a spinup directory
+    the data file is memory mapped so reads may be made from several threads
+    """
+    def __init__(self, spin_dir):
+        self.spin_dir = spin_dir
+        self.indx = read_spin_index(spin_dir)
+        self.fdata = open(join(spin_dir, SPIN_ARCHIVE_FN), 'rb')
+        if stat(join(spin_dir, SPIN_ARCHIVE_FN)).st_size > 0:
+            self.data = mmap(self.fdata.fileno(), 0, access=ACCESS_READ)
+        else:
+            self.data = None    # an empty file cannot be mapped
+
+    def __contains__(self, uid):
+        return uid in self.indx
+
+    def __len__(self):
+        return len(self.indx)
+
+    def read(self, uid):
+        """
+        content of the spinup file of uid
+        """
+        offset, length = self.indx[uid]
+        if length == 0:
+            return b''
+
+        return self.data[offset:offset + length]
+
+    def extract(self, uid, out_fn):
+        """
+        write the spinup file of uid to out_fn
+        """
+        with open(out_fn, 'wb') as fout:
+            fout.write(self.read(uid))
+
+        return
+
+    def close(self):
+        """
+        C
+        """
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        self.fdata.close()
+
+        return
+
+class SpinArchiveWriter(object, ):
+    """
+    appends spinup files to the archive of a spinup directory, creating it if necessary - may be used from
+    several threads
+    data is written before the index entry which refers to it so an interrupted append leaves no bad entry other
+    than possibly an incomplete last line of the index which is removed when the archive is next opened
+    """
+    def __init__(self, spin_dir):
+        _trim_spin_index(join(spin_dir, SPIN_INDX_FN))
+        self.fdata = open(join(spin_dir, SPIN_ARCHIVE_FN), 'ab')
+        self.findx = open(join(spin_dir, SPIN_INDX_FN), 'a')
+        self.offset = self.fdata.seek(0, 2)
+        self.lock = Lock()
+
+    def append(self, uid, content):
+        """
+        C
+        """
+        with self.lock:
+            self.fdata.write(content)
+            self.findx.write('{} {} {}\n'.format(uid, self.offset, len(content)))
+            self.offset += len(content)
+
+        return
+
+    def flush(self):
+        """
+        C
+        """
+        with self.lock:
+            self.fdata.flush()
+            self.findx.flush()
+
+        return
+
+    def close(self):
+        """
+        C
+        """
+        self.fdata.close()
+        self.findx.close()
+
+        return
+
+def fetch_spin_archive(spin_dir):
+    """
+    return SpinArchive for spin_dir or None if the directory has no archive - caller should close the archive
+    """
+    if is_spin_archive(spin_dir):
+        return SpinArchive(spin_dir)
+    else:
+        return None
+
+def count_spinups(spin_dir):
+    """
+    number of spinup files in spin_dir: taken from the index when there is an archive, which saves listing
+    the directory, otherwise by listing spinup_<UID>.dat files
+    """
+    if is_spin_archive(spin_dir):
+        return len(read_spin_index(spin_dir))
+
+    return sum(1 for entry in scandir(spin_dir)
+                            if entry.name.startswith(SPIN_PREFIX) and entry.name.endswith(SPIN_SFFX))
+
+def pack_spin_dir(spin_dir, keep_flag=False):
+    """
+    append every spinup_<UID>.dat file in spin_dir to its archive and, unless keep_flag is set, remove the file
+    files are removed only once the archive has been closed
+    """
+    start_time = time()
+    spin_fns = sorted(entry.name for entry in scandir(spin_dir) if entry.is_file()
+                                        and entry.name.startswith(SPIN_PREFIX) and entry.name.endswith(SPIN_SFFX))
+    print('Packing {} spinup files from {}'.format(len(spin_fns), spin_dir))
+    if len(spin_fns) == 0:
+        return
+
+    packed = []
+    writer = SpinArchiveWriter(spin_dir)
+    try:
+        for spin_fn in spin_fns:
+            try:
+                with open(join(spin_dir, spin_fn), 'rb') as fspin:
+                    content = fspin.read()
+            except OSError as err:
+                print(WARN_STR + 'could not read ' + spin_fn + ' - ' + str(err))
+                continue
+
+            writer.append(spin_fn[len(SPIN_PREFIX):-len(SPIN_SFFX)], content)
+            packed.append(spin_fn)
+    finally:
+        writer.close()
+
+    if not keep_flag:
+        for spin_fn in packed:
+            remove(join(spin_dir, spin_fn))
+
+    print('Packed {} spinup files into {} - archive holds {} spinup files - in {:.1f} seconds'
+                            .format(len(packed), SPIN_ARCHIVE_FN, count_spinups(spin_dir), time() - start_time))
+    return
+
+def main(argv=None):
+    """
+    pack the spinup directory given on the command line
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+
+    keep_flag = '--keep' in argv
+    argv = [arg for arg in argv if arg != '--keep']
+    if len(argv) != 1:
+        print('usage: python ' + __prog__ + ' spin_dir [--keep]')
+        return 1
+
+    pack_spin_dir(argv[0], keep_flag)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+#-------------------------------------------------------------------------------
+# Name:        stage_timers.py
+# Purpose:     optional timing of the stages of cell generation
+# Author:      Mike Martin
+# Created:     18/10/2026
+# Licence:     <your licence>
+# Description: each stage is timed by wrapping it in: with stage_timer('stage name'):
+#              timers are off unless enabled by enable_stage_timers in which case the duration of every call is kept
+#              and summarised as total, mean and 95th percentile per stage by report_stage_timers
+#              when off stage_timer returns a shared context manager which does nothing
+#-------------------------------------------------------------------------------
+#
+__prog__ = 'stage_timers.py'
+__version__ = '0.0.1'
+__author__ = 's03mm5'
+
+from array import array
+from time import perf_counter
+
+from numpy import frombuffer, percentile
+
+from headless_fns import process_events
+
+_tmrs = {'enabled': False, 'samples': {}}   # durations in seconds keyed by stage, in order of first use
+
+class _NullTimer(object, ):
+    """
+    used when timers are off
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _StageTimer(object, ):
+    """
+    records the duration of a stage - durations are appended to an array of doubles to limit memory
+    """
+    def __init__(self, stage):
+        self.stage = stage
+        self.start_time = None
+
+    def __enter__(self):
+        self.start_time = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        duration = perf_counter() - self.start_time
+        samples = _tmrs['samples'].get(self.stage)
+        if samples is None:
+            samples = _tmrs['samples'].setdefault(self.stage, array('d'))
+        samples.append(duration)
+        return False
+
+def enable_stage_timers(flag):
+    """
+    switch timers on or off and discard any durations already recorded
+    """
+    _tmrs['enabled'] = bool(flag)
+    _tmrs['samples'] = {}
+
+    return
+
+def stage_timer(stage):
+    """
+    return context manager which times stage if timers are enabled
+    """
+    if _tmrs['enabled']:
+        return _StageTimer(stage)
+    else:
+        return _NULL_TIMER
+
+def fetch_stage_samples():
+    """
+    return durations recorded so far and start afresh - used to pass durations from a worker process to the parent
+    """
+    samples = _tmrs['samples']
+    _tmrs['samples'] = {}
+
+    return samples
+
+def merge_stage_samples(samples):
+    """
+    add durations returned by fetch_stage_samples e.g. in a worker process
+    """
+    for stage, durations in samples.items():
+        _tmrs['samples'].setdefault(stage, array('d')).extend(durations)
+
+    return
+
+def report_stage_timers():
+    """
+    print total, mean and 95th percentile of the duration of each stage if timers are enabled
+    """
+    if not _tmrs['enabled']:
+        return
+
+    print('\nStage timings' + 24*' ' + 'calls     total s     mean ms      p95 ms')
+    for stage, durations in _tmrs['samples'].items():
+        vals = frombuffer(durations, dtype='d')
+        print('\t{:<28s}{:>10d}{:>12.2f}{:>12.3f}{:>12.3f}'.format(stage, len(vals), vals.sum(),
+                                                                    1000 * vals.mean(), 1000 * percentile(vals, 95)))
+    process_events()
+
+    return